@@ -1,27 +1,161 @@
 #!/usr/bin/python
-from natsort import natsorted
+from natsort import natsort_keygen
+import glob
+import hashlib
+import json
+import os
 import re
+import tempfile
+
+# Tags of the form v10.1 (then .2, -rc1, -5-gabcdef1...)
+DEFAULT_VERSION_PATTERN = r'^v\d{2}\.\d'
+
+# Natural order: v9.2 < v10.1 < v10.10
+natural_key = natsort_keygen()
+# Compiled patterns, by pattern string
+compiled_patterns = {}
+# Results of latest_version kept on disk: Ansible templates every task of every host in a
+# new worker process, a memo kept in memory would only ever serve its own process.
+LATEST_VERSION_CACHE_DIR = os.environ.get("LATEST_VERSION_CACHE_DIR",
+                                          os.path.expanduser("~/.cache/latest_version"))
+LATEST_VERSION_CACHE_SIZE = 256
+
+
+def compile_pattern(pattern):
+    if pattern not in compiled_patterns:
+        compiled_patterns[pattern] = re.compile(pattern)
+    return compiled_patterns[pattern]
+
+
+class DiskCache(object):
+    """
+    Memo shared by every process of the user, one JSON file per entry, bounded
+    to maxsize entries (the least recently used are removed first).
+
+    The hit and miss counters are two files that each lookup extends by one
+    byte (O_APPEND), so that concurrent workers never lose a count.
+    A cache directory that cannot be written only disables the memo.
+    """
+
+    def __init__(self, directory, maxsize):
+        self.directory = directory
+        self.maxsize = maxsize
+
+    def get(self, key, compute):
+        path = os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.json')
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+            self._count('hits')
+            return value
+        except (OSError, ValueError):
+            pass
+        self._count('misses')
+        value = compute()
+        try:
+            self._store(path, value)
+        except OSError:
+            pass
+        return value
+
+    def info(self):
+        return {'hits': self._read_count('hits'), 'misses': self._read_count('misses'),
+                'size': len(self._entries()), 'maxsize': self.maxsize, 'directory': self.directory}
+
+    def clear(self):
+        for path in self._entries() + [os.path.join(self.directory, name) for name in ('hits', 'misses')]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _entries(self):
+        return glob.glob(os.path.join(self.directory, '*.json'))
+
+    def _store(self, path, value):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.entry.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f)
+        os.replace(temp_path, path)
+        entries = self._entries()
+        if len(entries) > self.maxsize:
+            entries.sort(key=lambda entry: os.stat(entry).st_mtime if os.path.exists(entry) else 0)
+            for entry in entries[:len(entries) - self.maxsize]:
+                try:
+                    os.remove(entry)
+                except OSError:
+                    pass
+
+    def _count(self, name):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(os.path.join(self.directory, name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, b'.')
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def _read_count(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.directory, name))
+        except OSError:
+            return 0
+
+
+latest_version_cache = DiskCache(LATEST_VERSION_CACHE_DIR, LATEST_VERSION_CACHE_SIZE)
+
+
+def select_latest_version(versions, pattern, length):
+    search = compile_pattern(pattern).search
+    candidates = (version.strip() for version in versions)
+    candidates = (version for version in candidates
+                  if version and (length is None or len(version) == length) and search(version))
+    return max(candidates, key=natural_key, default='')
+
 
 class FilterModule(object):
     def filters(self):
         return {
             'a_filter': self.a_filter,
-            'latest_version': self.latest_version
+            'latest_version': self.latest_version,
+            'latest_version_cache_info': self.latest_version_cache_info
         }
     def a_filter(self, a_variable):
         a_new_variable = a_variable + ' CRAZY NEW FILTER'
         return a_new_variable
-    def latest_version(self, list_of_version):
-        array = list_of_version.split("\n")
-        sorted = natsorted(array)
-        res = sorted[::-1]
-        for val in res:
-            list_of_version = val
-            if len(list_of_version) == 5:
-                m = re.search(r'^(v\d{2}.\d{1})', list_of_version)
-                if m.group(0):
-                    break
-        return list_of_version
+    def latest_version(self, list_of_version, pattern=DEFAULT_VERSION_PATTERN, length=None):
+        """
+        Returns the highest version, in natural order, among those matching
+        the pattern (and of the given length, if any); '' when none matches.
 
+        One pass over the versions keeping the maximum, no sort:
+            {{ results.stdout | latest_version }}
+            {{ results.stdout | latest_version('^v\\d+\\.\\d+$') }}
+            {{ results.stdout | latest_version(length=5) }}
 
+        The result is memoized on disk on a digest of the versions, the pattern
+        and the length (see latest_version_cache_info): the same list templated
+        again, for another host by another worker process, costs a hash and a
+        small file read instead of a pass.
 
+        Args:
+            list_of_version: newline separated string, or list, of versions.
+            pattern (str): regular expression the versions must match (re.search).
+            length (int): exact length of the versions, None for any length.
+        """
+        if isinstance(list_of_version, str):
+            text = list_of_version
+        else:
+            text = "\n".join(list_of_version)
+        key = (hashlib.sha1(text.encode('utf-8')).hexdigest(), pattern, length)
+        return latest_version_cache.get(key, lambda: select_latest_version(text.split("\n"), pattern, length))
+    def latest_version_cache_info(self, _=None):
+        """
+        Hit and miss counters of the latest_version memo, all processes included:
+            {{ None | latest_version_cache_info }}
+        """
+        return latest_version_cache.info()
@@ -25,8 +25,7 @@ class ExampleInventory(object):
             self.inventory = self.example_inventory()
         # Called with `--host [hostname]`.
         elif self.args.host:
-            # Not implemented, since we return _meta info `--list`.
-            self.inventory = self.empty_inventory()
+            self.inventory = self.host_inventory(self.args.host)
         # If no groups or vars are present, return an empty inventory.
         else:
             self.inventory = self.empty_inventory()
@@ -53,6 +52,10 @@ class ExampleInventory(object):
             }
         }
 
+    # Variables of a single host, looked up in the _meta hostvars index.
+    def host_inventory(self, host):
+        return self.example_inventory()['_meta']['hostvars'].get(host, {})
+
     # Empty inventory for testing.
     def empty_inventory(self):
         return {'_meta': {'hostvars': {}}}
@@ -5,13 +5,25 @@
 Script Python 2.7.5 pour cloner ou mettre a jour un depot Git.
 Utilise 'subprocess' pour l'execution de commandes Git.
 Inclut une journalisation (logging) complete.
+
+Avec --agent, le script devient un agent de pull: il compare a intervalles
+irreguliers (--interval + un alea de --splay secondes) la tete distante de la
+branche avec le HEAD local, et n'execute le playbook local (--playbook) que
+lorsqu'un nouveau commit est arrive. SIGTERM arrete l'agent entre deux passages.
 """
 
 import os
 import sys
 import argparse
+import contextlib
+import fcntl
+import json
+import random
+import signal
 import subprocess
 import logging
+import tempfile
+import time
 
 # Configuration de la journalisation (logging)
 LOG_FILE = '/var/log/centos_ansible.log'
@@ -23,6 +35,19 @@ formatter = logging.Formatter('%(levelname)s: %(message)s')
 console.setFormatter(formatter)
 logging.getLogger('').addHandler(console)
 
+# Agent de pull
+LOCK_FILE = '/var/run/centos_ansible.lock'
+STATE_FILE = '/var/lib/centos_ansible/state.json'
+INTERVAL = 900
+SPLAY = 300
+# Delai maximal entre deux passages quand le depot distant est injoignable
+BACKOFF_MAX = 3600
+# Pas du sommeil de l'agent: un SIGTERM est pris en compte en moins de SLEEP_STEP secondes
+SLEEP_STEP = 1
+
+# Positionne par le gestionnaire de SIGTERM, lu entre deux passages
+stop_requested = False
+
 
 def execute_command(cmd, cwd=None):
     """
@@ -47,11 +72,86 @@ def execute_command(cmd, cwd=None):
         return False, str(e)
 
 
-def git_action(repo_url, branch, target_dir):
+def clone_options(depth=0, filter_spec=None, single_branch=False, reference=None):
+    """
+    Retourne les options de 'git clone' qui reduisent le transfert:
+    historique superficiel (--depth), clone partiel (--filter=blob:none),
+    branche unique et magasin d'objets partage (--reference).
+    """
+    options = []
+    if depth:
+        # --depth implique --single-branch
+        options += ['--depth', str(depth)]
+    elif single_branch:
+        options.append('--single-branch')
+    if filter_spec:
+        options.append('--filter=%s' % filter_spec)
+    if reference:
+        options += ['--reference', reference]
+    return options
+
+
+def reference_filter(reference, filter_spec=None, depth=0):
+    """
+    Retourne le filtre de clone partiel commun au miroir et aux checkouts qui
+    l'empruntent: un checkout complet ne peut pas emprunter un miroir partiel,
+    le filtre d'un miroir partiel existant est donc repris. Un nouveau miroir
+    ne peut pas etre superficiel; avec --depth il est cree sans les fichiers
+    (blob:none) pour ne pas telecharger tout leur historique au premier demarrage.
+    """
+    if filter_spec:
+        return filter_spec
+    if os.path.isdir(reference):
+        success, output = execute_command(['git', '--git-dir', reference, 'config', '--get',
+                                           'remote.origin.partialclonefilter'])
+        return output.strip() if success and output.strip() else None
+    return 'blob:none' if depth else None
+
+
+def update_reference(repo_url, reference, filter_spec=None):
+    """
+    Cree (git clone --mirror, partiel avec filter_spec) ou met a jour le miroir
+    local qui sert de magasin d'objets aux checkouts du noeud: les objets ne sont
+    telecharges qu'une fois. Un miroir partiel garde son filtre aux mises a jour.
+    Les checkouts empruntent ses objets (alternates), le gc du miroir est donc
+    desactive: apres un force-push il pourrait supprimer des objets encore utilises.
+    """
+    exists = os.path.isdir(reference)
+    if not exists:
+        parent = os.path.dirname(reference.rstrip('/'))
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent)
+        logging.info("Creation du miroir de reference %s", reference)
+        options = ['--filter=%s' % filter_spec] if filter_spec else []
+        success, output = execute_command(['git', 'clone', '--mirror'] + options + [repo_url, reference])
+        if not success:
+            return success, output
+    # Aussi pour les miroirs crees avant cette protection
+    for key, value in (('gc.auto', '0'), ('gc.pruneExpire', 'never')):
+        success, output = execute_command(['git', '--git-dir', reference, 'config', key, value])
+        if not success:
+            return success, output
+    if not exists:
+        return success, output
+    logging.info("Mise a jour du miroir de reference %s", reference)
+    return execute_command(['git', '--git-dir', reference, 'remote', 'update', '--prune'])
+
+
+def git_action(repo_url, branch, target_dir, depth=0, filter_spec=None, single_branch=False, reference=None):
     """
     Gere le clonage ou le pull du depot Git.
     """
 
+    if reference:
+        mirror_filter = reference_filter(reference, filter_spec, depth)
+        if mirror_filter != filter_spec:
+            logging.info("Miroir %s partiel: clone avec --filter=%s.", reference, mirror_filter)
+            filter_spec = mirror_filter
+        success, output = update_reference(repo_url, reference, filter_spec)
+        if not success:
+            logging.critical("ECHEC de la mise a jour du miroir %s. Sortie Git:\n%s", reference, output)
+            sys.exit(1)
+
     git_dir = os.path.join(target_dir, '.git')
     repo_exists = os.path.isdir(git_dir)
 
@@ -68,7 +168,8 @@ def git_action(repo_url, branch, target_dir):
                 logging.error("Impossible de creer le repertoire cible: %s", e)
                 sys.exit(1)
 
-        clone_cmd = ['git', 'clone', '--branch', branch, repo_url, target_dir]
+        clone_cmd = ['git', 'clone', '--branch', branch] + \
+            clone_options(depth, filter_spec, single_branch, reference) + [repo_url, target_dir]
         success, output = execute_command(clone_cmd)
 
         if success:
@@ -80,6 +181,21 @@ def git_action(repo_url, branch, target_dir):
     else:
         logging.info("Depot trouve. Tentative de MISE A JOUR (PULL) sur la branche %s...", branch)
 
+        if depth:
+            # Depot superficiel: pas d'historique commun pour un fast-forward,
+            # on recupere la tete distante et on s'y place.
+            fetch_cmd = ['git', 'fetch', '--depth', str(depth), 'origin',
+                         '+refs/heads/%s:refs/remotes/origin/%s' % (branch, branch)]
+            success, output = execute_command(fetch_cmd, cwd=target_dir)
+            if success:
+                success, output = execute_command(['git', 'checkout', '-B', branch, 'origin/%s' % branch],
+                                                  cwd=target_dir)
+            if not success:
+                logging.critical("ECHEC de la MISE A JOUR superficielle. Sortie Git:\n%s", output)
+                sys.exit(1)
+            logging.info("MISE A JOUR superficielle reussie sur la branche %s.", branch)
+            return
+
         checkout_cmd = ['git', 'checkout', branch]
         success, output = execute_command(checkout_cmd, cwd=target_dir)
 
@@ -100,6 +216,235 @@ def git_action(repo_url, branch, target_dir):
             sys.exit(1)
 
 
+def remote_head(repo_url, branch):
+    """
+    Retourne le commit de la branche sur le depot distant ('git ls-remote',
+    sans fetch), None si la commande echoue ou si la branche n'existe pas.
+    """
+    success, output = execute_command(['git', 'ls-remote', '--heads', repo_url, 'refs/heads/%s' % branch])
+    if not success or not output.strip():
+        return None
+    return output.split()[0].decode('ascii') if isinstance(output, bytes) else output.split()[0]
+
+
+def local_head(target_dir):
+    """
+    Retourne le commit du HEAD local, None si le depot n'existe pas.
+    """
+    if not os.path.isdir(os.path.join(target_dir, '.git')):
+        return None
+    success, output = execute_command(['git', 'rev-parse', 'HEAD'], cwd=target_dir)
+    if not success:
+        return None
+    return output.strip().decode('ascii') if isinstance(output, bytes) else output.strip()
+
+
+def load_state(state_file):
+    """
+    Lit le fichier d'etat de l'agent, un dictionnaire vide s'il n'existe pas.
+    """
+    try:
+        with open(state_file) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_state(state_file, state):
+    """
+    Ecrit le fichier d'etat via un fichier temporaire: un lecteur (supervision)
+    ne voit jamais un fichier partiel.
+    """
+    directory = os.path.dirname(state_file) or '.'
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.state.')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.rename(temp_path, state_file)
+
+
+def run_playbook(playbook, target_dir):
+    """
+    Execute le playbook local du depot (connexion locale).
+    Retourne (succes, duree en secondes).
+    """
+    started = time.time()
+    success, output = execute_command(['ansible-playbook', playbook, '-c', 'local'], cwd=target_dir)
+    return success, round(time.time() - started, 3)
+
+
+def pull_cycle(args, state):
+    """
+    Un passage de l'agent: 'git ls-remote', puis fetch et playbook seulement si
+    la branche a change (ou si le dernier playbook a echoue). Met a jour les
+    metriques de state. Retourne True si le passage a reussi.
+    """
+    started = time.time()
+    state['checks'] = state.get('checks', 0) + 1
+    state['last_check'] = started
+
+    remote = remote_head(args.repo_url, args.branch)
+    state['remote'] = remote
+    if remote is None:
+        # Serveur Git injoignable: un fetch complet echouerait aussi, on saute
+        # le passage et run_agent espace les suivants (remote_failures).
+        logging.warning("Tete distante de %s inconnue, passage saute.", args.branch)
+        state['failures'] = state.get('failures', 0) + 1
+        state['remote_failures'] = state.get('remote_failures', 0) + 1
+        state['last_error'] = "echec de git ls-remote"
+        state['last_duration'] = round(time.time() - started, 3)
+        return False
+    state['remote_failures'] = 0
+
+    head = local_head(args.target_dir)
+    if head != remote:
+        try:
+            git_action(args.repo_url, args.branch, args.target_dir,
+                       args.depth, args.filter_spec, args.single_branch, args.reference)
+        except SystemExit:
+            # git_action termine le script en cas d'echec: l'agent, lui, continue
+            state['failures'] = state.get('failures', 0) + 1
+            state['last_error'] = "echec de l'operation Git"
+            state['last_duration'] = round(time.time() - started, 3)
+            return False
+        head = local_head(args.target_dir)
+        if head != state.get('head'):
+            state['last_change'] = time.time()
+    else:
+        logging.info("Depot deja a jour (%s), pas de fetch.", head[:12])
+    state['head'] = head
+
+    success = True
+    if args.playbook and head != state.get('applied'):
+        logging.info("Execution du playbook %s pour le commit %s.", args.playbook, (head or '')[:12])
+        success, duration = run_playbook(args.playbook, args.target_dir)
+        state['runs'] = state.get('runs', 0) + 1
+        state['last_run'] = {'commit': head, 'started': time.time() - duration,
+                             'duration': duration, 'success': success}
+        if success:
+            state['applied'] = head
+        else:
+            # applied n'avance pas: le playbook sera relance au prochain passage
+            state['failures'] = state.get('failures', 0) + 1
+            state['last_error'] = "echec du playbook %s" % args.playbook
+
+    if success:
+        state['last_error'] = None
+    state['last_duration'] = round(time.time() - started, 3)
+    return success
+
+
+@contextlib.contextmanager
+def state_lock(args):
+    """
+    Verrou court (--lock-file + '.state') autour de chaque ecriture du fichier
+    d'etat, distinct du verrou tenu pendant tout un passage.
+    """
+    lock = open(args.lock_file + '.state', 'a')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+    finally:
+        lock.close()
+
+
+def locked_cycle(args):
+    """
+    Execute pull_cycle sous un verrou fcntl: un passage ne demarre pas tant que
+    le precedent (ou un lancement manuel) n'est pas termine.
+    Retourne True si le passage a reussi ou a ete saute.
+    """
+    lock_dir = os.path.dirname(args.lock_file)
+    if lock_dir and not os.path.exists(lock_dir):
+        os.makedirs(lock_dir)
+    lock = open(args.lock_file, 'a')
+    try:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            logging.warning("Un autre passage est en cours (%s), passage saute.", args.lock_file)
+            with state_lock(args):
+                state = load_state(args.state_file)
+                state['lock_skipped'] = state.get('lock_skipped', 0) + 1
+                save_state(args.state_file, state)
+            return True
+        state = load_state(args.state_file)
+        success = pull_cycle(args, state)
+        with state_lock(args):
+            # Passages sautes pendant celui-ci: le compteur du fichier fait foi
+            state['lock_skipped'] = load_state(args.state_file).get('lock_skipped', 0)
+            save_state(args.state_file, state)
+        return success
+    finally:
+        lock.close()
+
+
+def request_stop(signum, frame):
+    """
+    Gestionnaire de SIGTERM: le passage en cours (playbook compris) se termine
+    et son etat est enregistre, l'agent s'arrete ensuite.
+    """
+    global stop_requested
+    stop_requested = True
+    logging.info("Signal %s recu, arret apres le passage en cours.", signum)
+
+
+def sleep_until_stop(delay):
+    """
+    Attend delay secondes par pas de SLEEP_STEP, en s'interrompant des qu'un
+    arret est demande.
+    """
+    deadline = time.time() + delay
+    while not stop_requested:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(min(SLEEP_STEP, remaining))
+
+
+def next_delay(args, remote_failures):
+    """
+    interval + alea(0, splay) secondes, double a chaque echec consecutif de
+    'git ls-remote' (jusqu'a BACKOFF_MAX) pour ne pas insister sur un serveur
+    Git indisponible.
+    """
+    delay = args.interval
+    if remote_failures:
+        delay = max(delay, min(delay * 2 ** remote_failures, BACKOFF_MAX))
+    return delay + random.uniform(0, args.splay)
+
+
+def run_agent(args):
+    """
+    Boucle de l'agent: un premier delai aleatoire (0 a splay) etale les hotes
+    demarres en meme temps, puis un passage toutes les interval + alea(0, splay)
+    secondes, pour ne pas solliciter le serveur Git tous en meme temps.
+    """
+    signal.signal(signal.SIGTERM, request_stop)
+    # Les appels systeme en cours (attente du playbook) reprennent apres le signal
+    signal.siginterrupt(signal.SIGTERM, False)
+    delay = random.uniform(0, args.splay)
+    logging.info("Agent demarre: intervalle %ss, alea %ss, premier passage dans %.0fs.",
+                 args.interval, args.splay, delay)
+    while True:
+        sleep_until_stop(delay)
+        if stop_requested:
+            break
+        try:
+            locked_cycle(args)
+        except Exception as e:
+            logging.error("Passage de l'agent en erreur: %s", e)
+        if stop_requested:
+            break
+        remote_failures = load_state(args.state_file).get('remote_failures', 0)
+        delay = next_delay(args, remote_failures)
+        if remote_failures:
+            logging.warning("Depot distant injoignable (%d echecs), prochain passage dans %.0fs.",
+                            remote_failures, delay)
+    logging.info("Agent arrete.")
+
+
 def main():
     """
     Fonction principale pour l'analyse des arguments et l'execution.
@@ -123,10 +468,69 @@ def main():
         help='Nom de la branche a utiliser (defaut: main). Le script effectue un checkout avant le pull.'
     )
 
+    parser.add_argument(
+        '--depth', type=int, default=0,
+        help='Clone superficiel des N derniers commits (defaut: 0, tout l\'historique).'
+    )
+    parser.add_argument(
+        '--filter', dest='filter_spec', default=None,
+        help='Clone partiel, ex: blob:none (les fichiers sont telecharges au checkout).'
+    )
+    parser.add_argument(
+        '--single-branch', action='store_true',
+        help='Ne clone que la branche demandee.'
+    )
+    parser.add_argument(
+        '--reference', default=None,
+        help='Miroir local partage par les checkouts du noeud (cree s\'il n\'existe pas), ex: /var/cache/git/config.git'
+    )
+
+    parser.add_argument(
+        '--playbook', default=None,
+        help='Playbook du depot a executer en local (-c local) quand la branche a change, ex: site.yml'
+    )
+    parser.add_argument(
+        '--agent', action='store_true',
+        help='Agent de pull: verifie la branche en boucle et n\'applique le playbook qu\'en cas de changement.'
+    )
+    parser.add_argument(
+        '--interval', type=int, default=INTERVAL,
+        help='Agent: secondes entre deux verifications (defaut: %d).' % INTERVAL
+    )
+    parser.add_argument(
+        '--splay', type=int, default=SPLAY,
+        help='Agent: alea maximal ajoute a chaque intervalle, en secondes (defaut: %d).' % SPLAY
+    )
+    parser.add_argument(
+        '--lock-file', default=LOCK_FILE,
+        help='Verrou empechant deux passages simultanes (defaut: %s).' % LOCK_FILE
+    )
+    parser.add_argument(
+        '--state-file', default=STATE_FILE,
+        help='Fichier JSON des metriques de l\'agent (defaut: %s).' % STATE_FILE
+    )
+
     args = parser.parse_args()
 
+    if args.agent:
+        try:
+            run_agent(args)
+        except KeyboardInterrupt:
+            logging.info("Agent arrete.")
+        return
+
+    if args.playbook:
+        # Un seul passage de l'agent (ex: depuis un timer systemd ou cron)
+        try:
+            success = locked_cycle(args)
+        except Exception as e:
+            logging.critical("Une erreur inattendue est survenue: %s", e)
+            sys.exit(1)
+        sys.exit(0 if success else 1)
+
     try:
-        git_action(args.repo_url, args.branch, args.target_dir)
+        git_action(args.repo_url, args.branch, args.target_dir,
+                   args.depth, args.filter_spec, args.single_branch, args.reference)
         logging.info("Operation Git terminee avec succes.")
     except Exception as e:
         logging.critical("Une erreur inattendue est survenue: %s", e)
@@ -3,26 +3,397 @@
 import docker
 import json
 import argparse
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from inventory_cache import InventoryCache
+
+# Daemons to query, "alias=url" separated by commas, e.g.
+# "lab1=tcp://10.0.0.11:2375,lab2=unix:///run/lab2/docker.sock".
+# Without it the daemon of DOCKER_HOST (or the local socket) is used.
+ENDPOINTS_ENV = "DOCKER_INVENTORY_ENDPOINTS"
+# Seconds a daemon has to answer before it is left out of the inventory
+ENDPOINT_TIMEOUT = 5
+# Seconds between two scans of the watcher while a daemon is left out
+RESCAN_INTERVAL = 30
+
+# Events after which a container appears in or disappears from containers.list()
+# ('kill' may only send a signal, and paused containers are still listed;
+# a container that really stops also sends 'die')
+START_EVENTS = ("start",)
+STOP_EVENTS = ("die", "stop", "destroy")
+# Image ID -> tags, per Docker client (see get_image_tags)
+IMAGE_TAGS = {}
+
+# Container labels read by the inventory:
+#   ansible.group=web,db       groups of the host (comma separated)
+#   ansible.user=alma          ansible_user, same for the other LABEL_VARS
+#   ansible.var.http_port=8080 any other host variable
+LABEL_PREFIX = "ansible."
+LABEL_VARS = {
+    "user": "ansible_user",
+    "port": "ansible_port",
+    "host": "ansible_host",
+    "key": "ansible_ssh_private_key_file",
+    "python": "ansible_python_interpreter",
+}
+DEFAULT_USER = "root"
+DEFAULT_KEY = "~/.ssh/id_rsa_docker_test"
+
+# url is None for the daemon of the environment
+Endpoint = namedtuple("Endpoint", ["alias", "url"])
 
 def get_ssh_port(container):
     """
     Finds the host port mapped to the container's port 22/tcp.
     Returns the host port as a string, or None if not found.
     """
+    # 'Ports' of the list payload only holds the published ports, no inspect needed.
+    for port in container.attrs.get('Ports') or []:
+        if port.get('PrivatePort') == 22 and port.get('Type') == 'tcp' and port.get('PublicPort'):
+            return str(port['PublicPort'])
+    return None
+
+def get_image_tags(client, refresh=False):
+    """
+    Returns the image ID -> tags map of the daemon.
+
+    Built with a single GET /images/json and kept for the rest of the run, so
+    that resolving the image of a container never costs an API call. The
+    low-level API is used on purpose: images.list() inspects every image.
+    """
+    if refresh or client not in IMAGE_TAGS:
+        IMAGE_TAGS[client] = {
+            image["Id"]: [tag for tag in image.get("RepoTags") or [] if tag != "<none>:<none>"]
+            for image in client.api.images()
+        }
+    return IMAGE_TAGS[client]
+
+def container_tags(container, image_tags=None):
+    """
+    Returns the tags of the image of a container.
+
+    Without image_tags, the image the container was created from (list
+    payload) is used instead, which costs no API call.
+    """
+    if image_tags is not None:
+        return image_tags.get(container.attrs.get('ImageID'), [])
+    image = container.attrs.get('Image') or ''
+    return [] if not image or image.startswith('sha256:') else [image]
+
+def group_name(name):
+    """Returns a valid Ansible group name."""
+    return re.sub(r'[^A-Za-z0-9_]', '_', name.strip())
+
+def label_settings(labels):
+    """
+    Returns the (host vars, groups) set by the ansible.* labels of a container.
+    """
+    hostvars, groups = {}, []
+    for key, value in (labels or {}).items():
+        if not key.startswith(LABEL_PREFIX):
+            continue
+        key = key[len(LABEL_PREFIX):]
+        if key == "group":
+            groups.extend(group_name(group) for group in value.split(',') if group.strip())
+        elif key in LABEL_VARS:
+            hostvars[LABEL_VARS[key]] = value
+        elif key.startswith("var."):
+            hostvars[key[len("var."):]] = value
+    return hostvars, groups
+
+def container_ip(container):
+    """Returns the first IP address of the container networks in the list payload."""
+    for network in ((container.attrs.get('NetworkSettings') or {}).get('Networks') or {}).values():
+        if network.get('IPAddress'):
+            return network['IPAddress']
+    return None
+
+def parse_endpoints(specs):
+    """
+    Returns the Endpoints of "alias=url" (or bare "url") specifications.
+    """
+    endpoints = []
+    for spec in specs:
+        alias, _, url = spec.strip().rpartition('=')
+        if not alias:
+            alias = urlparse(url).hostname or os.path.basename(url)
+        endpoints.append(Endpoint(alias, url))
+    return endpoints or [Endpoint("local", None)]
+
+def endpoint_client(endpoint, timeout=ENDPOINT_TIMEOUT):
+    """
+    Returns a Docker client of the endpoint; every API call times out after `timeout` seconds.
+    """
+    if endpoint.url is None:
+        return docker.from_env(timeout=timeout)
+    return docker.DockerClient(base_url=endpoint.url, timeout=timeout)
+
+def endpoint_host(endpoint):
+    """
+    Returns the address Ansible connects to for the containers of an endpoint.
+    """
+    if endpoint.url is None or endpoint.url.startswith("unix://"):
+        return "127.0.0.1"
+    return urlparse(endpoint.url).hostname
+
+def daemon_group(endpoint):
+    """Returns the inventory group of the containers of an endpoint."""
+    return "docker_" + group_name(endpoint.alias)
+
+def list_containers(client, filters=None):
+    """
+    Lists the running containers without inspecting them (one API call).
+    """
+    return client.containers.list(sparse=True, filters=filters)
+
+def container_entry(container, image_tags=None, endpoint=Endpoint("local", None), federated=False):
+    """
+    Returns the (host name, host vars, groups) of a container of
+    list_containers(), or None if it cannot be reached over SSH.
+
+    Everything comes from the list payload: the published port 22, the image
+    (see container_tags) and the ansible.* labels, which set host variables and groups (see
+    LABEL_VARS). A labelled container of a local daemon that publishes no
+    port is reached on port 22 of its own IP address, like the lab pools.
+
+    Containers of a configured endpoint also join the group of their daemon;
+    when several daemons are federated, the host name is "name.alias" since
+    container names are only unique per daemon.
+    """
+    label_vars, label_groups = label_settings(container.attrs.get('Labels'))
+    ssh_port = get_ssh_port(container)
+    if ssh_port:
+        # Ansible will connect to the Docker host's IP on the dynamically mapped port
+        connection = {"ansible_host": endpoint_host(endpoint), "ansible_port": ssh_port}
+    elif (label_vars or label_groups) and endpoint_host(endpoint) == "127.0.0.1" and container_ip(container):
+        connection = {"ansible_host": container_ip(container), "ansible_port": "22"}
+    elif "ansible_host" in label_vars:
+        connection = {"ansible_port": "22"}
+    else:
+        # We only add containers that can be reached on port 22 to the inventory
+        return None
+    # Sparse containers have no 'Name', only the 'Names' of the list payload
+    container_name = container.attrs['Names'][0].lstrip('/')
+    if federated:
+        container_name += "." + endpoint.alias
+    tags = container_tags(container, image_tags)
+
+    # Define the connection variables for this container, labels have the last word
+    hostvars = dict(connection)
+    hostvars.update({
+        "ansible_user": DEFAULT_USER,
+        "ansible_ssh_private_key_file": DEFAULT_KEY,
+        "docker_image": tags[0] if tags else 'unknown'
+    })
+
+    # Add the container to the main group
+    groups = ["docker_containers"]
+    if endpoint.url is not None:
+        hostvars["docker_endpoint"] = endpoint.alias
+        groups.append(daemon_group(endpoint))
+    # Dynamically create groups based on the container image name
+    if tags:
+        groups.append(group_name(tags[0].rpartition(':')[0] or tags[0]))
+    # Images without tags get no image group
+    hostvars.update(label_vars)
+    groups.extend(group for group in label_groups if group not in groups)
+    return container_name, hostvars, groups
+
+def add_host(inventory, host, hostvars, groups):
+    """
+    Adds one host, with its variables, to the inventory groups.
+    """
+    inventory["_meta"]["hostvars"][host] = hostvars
+    for group in groups:
+        if group not in inventory:
+            inventory[group] = {"hosts": []}
+        inventory[group]["hosts"].append(host)
+
+def get_cache(endpoints):
+    """
+    Returns the inventory cache of the Docker daemons.
+    """
+    daemons = ",".join(endpoint.url or os.environ.get("DOCKER_HOST", "") for endpoint in endpoints)
+    return InventoryCache("get_containers", daemons)
+
+def get_inventory(endpoints, refresh=False, timeout=ENDPOINT_TIMEOUT):
+    """
+    Returns the inventory from the cache, or generates it (and caches it) when
+    the cache is missing, expired or refresh is True.
+    """
+    cache = get_cache(endpoints)
+    inventory = None if refresh else cache.load()
+    if inventory is None:
+        inventory, skipped = generate_inventory(endpoints, timeout)
+        # An empty or partial inventory may only mean a daemon was unreachable, do not keep it
+        if inventory["_meta"]["hostvars"] and not skipped:
+            cache.save(inventory)
+    return inventory
+
+def get_host(host, endpoints, timeout=ENDPOINT_TIMEOUT):
+    """
+    Returns the variables of one host: from the cache when it is fresh, else
+    from a single lookup of that container (never a listing of the daemon).
+    """
+    cached = get_cache(endpoints).host_vars(host)
+    if cached is not None:
+        return cached
+    federated = len(endpoints) > 1
+    name, endpoint = host, endpoints[0]
+    if federated:
+        name, _, alias = host.rpartition('.')
+        endpoint = next((endpoint for endpoint in endpoints if endpoint.alias == alias), None)
+        if endpoint is None:
+            return {}
+    try:
+        client = endpoint_client(endpoint, timeout)
+        # The name filter matches substrings, keep the exact name only
+        containers = [container for container in list_containers(client, {"name": name})
+                      if container.attrs['Names'][0].lstrip('/') == name]
+        if not containers:
+            return {}
+        # The image comes from the list payload, the images of the daemon are not listed
+        entry = container_entry(containers[0], None, endpoint, federated)
+    except Exception:
+        # Daemon not accessible
+        return {}
+    return entry[1] if entry else {}
+
+def watch(endpoints, timeout=ENDPOINT_TIMEOUT):
+    """
+    Keeps the inventory cache up to date from the Docker events of every endpoint.
+
+    Only the container named in an event is looked up again: started
+    containers are added, stopped ones removed. While this runs, --list is
+    always served from the cache. While a daemon is left out of the scan, the
+    cache is saved stale (--list scans again) and every daemon is scanned again
+    each RESCAN_INTERVAL seconds.
+    """
+    cache = get_cache(endpoints)
+    inventory, skipped = generate_inventory(endpoints, timeout)
+    cache.save(inventory, stale=bool(skipped))
+    scanned_at = time.monotonic()
+    cache.register_watcher()
+    # The cache file is patched by one thread per endpoint
+    lock = threading.Lock()
+    threads = {
+        endpoint: threading.Thread(target=watch_endpoint, args=(endpoint, endpoints, cache, lock, timeout), daemon=True)
+        for endpoint in endpoints
+    }
     try:
-        # Port bindings are nested and can be complex. We need to find the one for 22/tcp.
-        bindings = container.attrs['HostConfig']['PortBindings']
-        if '22/tcp' in bindings and bindings['22/tcp'] is not None:
-            return bindings['22/tcp'][0]['HostPort']
-    except (KeyError, IndexError):
-        # This happens if there are no port bindings or no mapping for port 22.
+        for thread in threads.values():
+            thread.start()
+        while any(thread.is_alive() for thread in threads.values()):
+            time.sleep(1)
+            if skipped and time.monotonic() - scanned_at >= RESCAN_INTERVAL:
+                with lock:
+                    inventory, skipped = generate_inventory(endpoints, timeout)
+                    cache.save(inventory, stale=bool(skipped))
+                scanned_at = time.monotonic()
+                # Daemons that answer again are followed again
+                for endpoint, thread in threads.items():
+                    if not thread.is_alive() and endpoint.alias not in skipped:
+                        threads[endpoint] = threading.Thread(
+                            target=watch_endpoint, args=(endpoint, endpoints, cache, lock, timeout), daemon=True)
+                        threads[endpoint].start()
+    except KeyboardInterrupt:
         pass
-    return None
+    finally:
+        cache.unregister_watcher()
+
+def watch_endpoint(endpoint, endpoints, cache, lock, timeout=ENDPOINT_TIMEOUT):
+    """
+    Follows the container events of one endpoint and patches the cache.
+    """
+    federated = len(endpoints) > 1
+    suffix = "." + endpoint.alias if federated else ""
+    try:
+        client = endpoint_client(endpoint, timeout)
+        # docker-py reads the event stream without the client timeout
+        for event in client.events(decode=True, filters={"type": "container"}):
+            action = event.get("Action", event.get("status", ""))
+            name = event.get("Actor", {}).get("Attributes", {}).get("name")
+            if action in START_EVENTS:
+                containers = list_containers(client, {"id": event["Actor"]["ID"]})
+                if not containers:
+                    continue
+                # Images may have been pulled or tagged since the last event
+                entry = container_entry(containers[0], get_image_tags(client, refresh=True), endpoint, federated)
+                if entry:
+                    with lock:
+                        cache.patch_host(*entry)
+            elif action in STOP_EVENTS and name:
+                with lock:
+                    cache.remove_host(name + suffix)
+            elif action == "rename":
+                with lock:
+                    inventory, skipped = generate_inventory(endpoints, timeout)
+                    cache.save(inventory, stale=bool(skipped))
+    except Exception as e:
+        print("Warning: stopped following the events of '%s': %s" % (endpoint.alias, e), file=sys.stderr)
 
-def generate_inventory():
+def scan_endpoint(endpoint, federated, timeout=ENDPOINT_TIMEOUT):
+    """
+    Returns the inventory entries of the containers of one endpoint (two API calls:
+    GET /containers/json and GET /images/json).
     """
-    Generates the Ansible inventory by inspecting local Docker containers.
+    client = endpoint_client(endpoint, timeout)
+    containers = list_containers(client)
+    try:
+        image_tags = get_image_tags(client)
+    except Exception as e:
+        # Without the images, containers are still listed, with docker_image 'unknown'
+        print("Warning: images of Docker daemon '%s' not listed: %s" % (endpoint.alias, e), file=sys.stderr)
+        image_tags = {}
+    entries = [container_entry(container, image_tags, endpoint, federated) for container in containers]
+    return [entry for entry in entries if entry]
+
+def scan_endpoints(endpoints, timeout=ENDPOINT_TIMEOUT):
+    """
+    Scans every endpoint concurrently.
+
+    Each endpoint has `timeout` seconds to answer; a dead or slow daemon is
+    reported on stderr and left out, the others are still returned.
+
+    Returns:
+        dict: endpoint alias -> list of inventory entries
     """
+    federated = len(endpoints) > 1
+    results = {}
+
+    def scan(endpoint):
+        try:
+            results[endpoint.alias] = scan_endpoint(endpoint, federated, timeout)
+        except Exception as e:
+            print("Warning: Docker daemon '%s' not accessible: %s" % (endpoint.alias, e), file=sys.stderr)
+
+    # Daemon threads: a daemon stuck past its deadline does not hold the script
+    threads = [threading.Thread(target=scan, args=(endpoint,), daemon=True) for endpoint in endpoints]
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.start()
+    for endpoint, thread in zip(endpoints, threads):
+        thread.join(max(0, deadline - time.monotonic()))
+        if thread.is_alive():
+            print("Warning: Docker daemon '%s' did not answer within %ss, skipped." % (endpoint.alias, timeout),
+                  file=sys.stderr)
+    # A copy: a skipped daemon may still answer after the deadline
+    return dict(results)
+
+def generate_inventory(endpoints=None, timeout=ENDPOINT_TIMEOUT):
+    """
+    Generates the Ansible inventory by inspecting the containers of the Docker endpoints.
+
+    Returns:
+        tuple: (inventory, aliases of the endpoints left out because they did not answer)
+    """
+    endpoints = endpoints or parse_endpoints([])
     inventory = {
         "_meta": {
             "hostvars": {}
@@ -37,48 +408,19 @@ def generate_inventory():
             "hosts": []
         }
     }
+    for endpoint in endpoints:
+        if endpoint.url is not None:
+            inventory["all"]["children"].append(daemon_group(endpoint))
+            inventory[daemon_group(endpoint)] = {"hosts": []}
 
-    try:
-        # Connect to the local Docker daemon using the default socket
-        client = docker.from_env()
-        containers = client.containers.list()
-    except Exception as e:
-        # If Docker is not running or accessible, return an empty inventory
-        # print(f"Could not connect to Docker daemon: {e}")
-        return inventory
-
-    for container in containers:
-        ssh_port = get_ssh_port(container)
-
-        # We only add containers that expose a port 22 to the inventory
-        if ssh_port:
-            container_name = container.name
-            
-            # Add the container to the main group
-            inventory["docker_containers"]["hosts"].append(container_name)
-
-            # Define the connection variables for this container
-            inventory["_meta"]["hostvars"][container_name] = {
-                # Ansible will connect to the Docker host's IP
-                "ansible_host": "127.0.0.1",
-                # on the dynamically mapped port
-                "ansible_port": ssh_port,
-                # Assume a user and key (in a real scenario, get this from labels)
-                "ansible_user": "root",
-                "ansible_ssh_private_key_file": "~/.ssh/id_rsa_docker_test",
-                "docker_image": container.image.tags[0] if container.image.tags else 'unknown'
-            }
-            
-            # Dynamically create groups based on the container image name
-            try:
-                image_name_group = container.image.tags[0].split(':')[0].replace('/', '_')
-                if image_name_group not in inventory:
-                    inventory[image_name_group] = {"hosts": []}
-                inventory[image_name_group]["hosts"].append(container_name)
-            except IndexError:
-                pass # Happens for images without tags
+    # If a daemon is not running or accessible, its containers are left out
+    results = scan_endpoints(endpoints, timeout)
+    for endpoint in endpoints:
+        for entry in results.get(endpoint.alias, []):
+            add_host(inventory, *entry)
 
-    return inventory
+    skipped = [endpoint.alias for endpoint in endpoints if endpoint.alias not in results]
+    return inventory, skipped
 
 def main():
     """
@@ -87,15 +429,24 @@ def main():
     parser = argparse.ArgumentParser(description="Ansible dynamic inventory for local Docker containers with SSH.")
     parser.add_argument('--list', action='store_true', help='List all inventory groups and hosts.')
     parser.add_argument('--host', help='Get all variables about a specific host.')
+    parser.add_argument('--refresh-cache', action='store_true', help='Ignore the cached inventory and rebuild it.')
+    parser.add_argument('--watch', action='store_true', help='Keep the inventory cache up to date from the Docker events.')
+    parser.add_argument('--endpoint', action='append', default=[],
+                        help='Docker daemon to query, alias=url (repeatable). Default: $%s, else DOCKER_HOST.' % ENDPOINTS_ENV)
+    parser.add_argument('--timeout', type=float, default=ENDPOINT_TIMEOUT,
+                        help='Seconds each daemon has to answer (default: %(default)s).')
     args = parser.parse_args()
 
-    if args.list:
-        inventory_data = generate_inventory()
+    specs = args.endpoint or [spec for spec in os.environ.get(ENDPOINTS_ENV, "").split(",") if spec.strip()]
+    endpoints = parse_endpoints(specs)
+
+    if args.watch:
+        watch(endpoints, args.timeout)
+    elif args.list:
+        inventory_data = get_inventory(endpoints, refresh=args.refresh_cache, timeout=args.timeout)
         print(json.dumps(inventory_data, indent=2))
     elif args.host:
-        # A full implementation would rediscover just this host's vars.
-        # For this example, returning an empty JSON is sufficient.
-        print(json.dumps({}))
+        print(json.dumps(get_host(args.host, endpoints, args.timeout), indent=2))
     else:
         parser.print_help()
 
@@ -0,0 +1 @@
+../inventaire_dynamic/inventory_cache.py
\ No newline at end of file
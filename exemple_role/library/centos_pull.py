@@ -2,8 +2,27 @@
 # -*- coding: utf-8 -*-
 
 from ansible.module_utils.basic import AnsibleModule
+from collections import deque
+from datetime import datetime
+import fnmatch
+import hashlib
+import json
+import logging
+import logging.handlers
+import re
 import subprocess
 import os
+import yaml
+
+# Taille maximale d'une ligne conservée dans la fin de sortie renvoyée au contrôleur
+TAIL_LINE_LENGTH = 500
+# Nombre de tâches (les plus lentes) détaillées dans le récapitulatif
+RECAP_TASKS = 20
+# Référence du dépôt cloné qui garde le dernier commit dont le playbook a réussi,
+# et préfixe de celles des exécutions limitées par l'option tags (une par ensemble de tags)
+APPLIED_REF = "refs/centos_pull/applied"
+APPLIED_TAGS_REF = "refs/centos_pull/applied-tags"
+RECAP_LINE = re.compile(r'^(\S+)\s+:\s+((?:\w+=\d+\s*)+)$')
 
 # ==============================================================================
 # DOCUMENTATION du Module centos_pull
@@ -15,8 +34,13 @@ short_description: Gère le clone/pull d'un dépôt GitHub et exécute un playbo
 version_added: "1.0.1"
 description:
     - Ce module est conçu pour les hôtes CentOS.
-    - Il clone un dépôt si nécessaire.
-    - Effectue un 'git pull' si le dépôt existe.
+    - Compare d'abord la tête distante de la branche ('git ls-remote') avec le HEAD local.
+      Si elles sont identiques et que ce commit a déjà été appliqué avec succès, ni fetch ni playbook
+      ne sont lancés (changed=false).
+    - Le dernier commit appliqué avec succès est conservé dans la référence refs/centos_pull/applied du dépôt
+      (refs/centos_pull/applied-tags/<empreinte des tags> avec l'option tags) :
+      après un échec du playbook, l'exécution suivante le relance même si la branche n'a pas bougé.
+    - Sinon il clone le dépôt s'il est absent, ou récupère la branche et avance en fast-forward.
     - Exécute ensuite un playbook Ansible local à l'intérieur du dépôt cloné.
 options:
     repo_url:
@@ -37,14 +61,455 @@ options:
         type: str
         default: main
     tags:
-        description: Liste des tags à passer au playbook local (ex: deploy, config).
+        description:
+            - Liste des tags à passer au playbook local (ex: deploy, config).
+            - Combinés avec tag_map, seuls les tags de cette liste touchés par le diff sont exécutés.
+              Le commit appliqué est alors suivi pour cet ensemble de tags seulement.
         required: false
         type: list
+        elements: str
         default: []
+    tag_map:
+        description:
+            - Fichier du dépôt associant des chemins (motifs fnmatch, '*' traverse les répertoires) à des tags.
+            - Après une mise à jour, seuls les tags des fichiers modifiés depuis le dernier commit appliqué avec succès
+              (refs/centos_pull/applied) sont exécutés.
+            - Un fichier modifié qui ne correspond à aucun motif (ou le fichier de correspondance lui-même),
+              un commit appliqué inconnu ou absent (clone superficiel) ou un premier clone entraînent une exécution complète.
+            - Une liste de tags vide ([]) signifie que le chemin ne demande aucune exécution (ex. README.md).
+        required: false
+        type: str
+        default: .pull_tags.yml
+    force_playbook:
+        description: Exécute le playbook même si le dépôt est déjà à jour.
+        required: false
+        type: bool
+        default: false
+    depth:
+        description: Clone superficiel des N derniers commits (--depth), les mises à jour restent superficielles. 0 pour tout l'historique.
+        required: false
+        type: int
+        default: 0
+    filter:
+        description: Clone partiel (--filter), ex. blob:none ; les fichiers ne sont téléchargés qu'au checkout.
+        required: false
+        type: str
+    single_branch:
+        description: Ne clone que la branche suivie (--single-branch).
+        required: false
+        type: bool
+        default: false
+    output_mode:
+        description:
+            - capture garde toute la sortie du playbook en mémoire et la renvoie dans playbook_output.
+            - stream écrit la sortie au fil de l'eau dans log_file (avec rotation) et ne renvoie que
+              les output_tail dernières lignes et un récapitulatif (playbook_recap).
+        required: false
+        type: str
+        choices: [capture, stream]
+        default: capture
+    log_file:
+        description: Fichier journal du mode stream, sur l'hôte cible.
+        required: false
+        type: path
+        default: /var/log/centos_pull/<nom de target_dir>.log
+    log_max_bytes:
+        description: Taille à partir de laquelle log_file est archivé (log_file.1, log_file.2...).
+        required: false
+        type: int
+        default: 10485760
+    log_backups:
+        description: Nombre d'archives de log_file conservées.
+        required: false
+        type: int
+        default: 5
+    output_tail:
+        description: Nombre de lignes de fin de sortie renvoyées en mode stream.
+        required: false
+        type: int
+        default: 100
+    stdout_callback:
+        description:
+            - Callback de sortie du playbook en mode stream (ANSIBLE_STDOUT_CALLBACK). Par défaut, celui configuré sur la cible.
+            - ansible.posix.jsonl (collection ansible.posix récente) écrit un objet JSON par événement et donne aussi
+              la durée des tâches ; avec un autre callback, le récapitulatif vient de la ligne PLAY RECAP.
+            - Un callback absent de la cible (ansible-doc -t callback -l) est ignoré avec un avertissement.
+        required: false
+        type: str
+    reference:
+        description:
+            - Magasin d'objets local partagé (miroir nu du dépôt), créé s'il n'existe pas et mis à jour avant chaque clone.
+            - Les clones l'utilisent via --reference (alternates) : plusieurs checkouts du même nœud ne téléchargent les objets qu'une fois.
+            - Le miroir suit tout l'historique (depth ne s'y applique pas) : il n'est utile qu'à partir de deux checkouts sur le nœud.
+            - Le miroir est créé avec filter, et les checkouts reprennent le filtre d'un miroir partiel. Avec depth sans filter,
+              un nouveau miroir est créé avec blob:none (historique des commits seulement, fichiers téléchargés au checkout).
+        required: false
+        type: path
 author:
     - AI Assistant
 '''
 
+EXAMPLES = r'''
+# .pull_tags.yml, à la racine du dépôt :
+#   roles/web/*: [web]
+#   roles/db/*: [db]
+#   templates/nginx.conf.j2: [web]
+#   group_vars/*: [web, db]
+#   README.md: []
+- name: Mettre à jour la configuration et n'exécuter que les tags touchés
+  centos_pull:
+    repo_url: https://github.com/crunchy-devops/essai_ansible_pull.git
+    target_dir: /opt/app_config
+    playbook_name: site.yml
+
+- name: Gros converge, sortie écrite sur la cible et seulement résumée dans le résultat
+  centos_pull:
+    repo_url: https://github.com/crunchy-devops/essai_ansible_pull.git
+    target_dir: /opt/app_config
+    playbook_name: site.yml
+    output_mode: stream
+    output_tail: 20
+'''
+
+RETURN = r'''
+repo_state:
+    description: État du dépôt après l'exécution.
+    returned: always
+    type: dict
+    contains:
+        state:
+            description: cloned, updated ou unchanged.
+            type: str
+        branch:
+            description: Branche suivie.
+            type: str
+        before:
+            description: Commit local avant l'exécution (null si le dépôt n'existait pas).
+            type: str
+        after:
+            description: Commit local après l'exécution.
+            type: str
+        remote:
+            description: Tête de la branche sur le dépôt distant.
+            type: str
+        applied:
+            description: Dernier commit dont le playbook a réussi pour les tags demandés (refs/centos_pull/applied...), null si aucun.
+            type: str
+tag_selection:
+    description: Tags exécutés (null pour une exécution complète) et raison du choix.
+    returned: always
+    type: dict
+    sample: {"tags": ["web"], "reason": "3 fichier(s) modifié(s), tous associés à des tags"}
+playbook_run:
+    description: Le playbook local a-t-il été exécuté ?
+    returned: always
+    type: bool
+playbook_output:
+    description: Sortie complète (capture) ou dernières lignes (stream) du playbook.
+    returned: always
+    type: str
+playbook_log:
+    description: Fichier journal contenant la sortie complète.
+    returned: when output_mode is stream
+    type: str
+playbook_recap:
+    description:
+        - Compteurs de la ligne PLAY RECAP, sommés sur les hôtes, et durée des tâches les plus lentes (en secondes).
+        - tasks n'est renseigné qu'avec stdout_callback=ansible.posix.jsonl.
+    returned: when the playbook ran
+    type: dict
+    sample: {"ok": 12, "changed": 3, "failed": 0, "unreachable": 0, "skipped": 2, "rescued": 0, "ignored": 0,
+             "tasks": [{"name": "Installer nginx", "duration": 41.2}]}
+'''
+
+
+def git(args, cwd=None):
+    """
+    Lance une commande git (liste d'arguments, sans shell).
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    return subprocess.run(["git"] + args, capture_output=True, text=True, check=False, cwd=cwd)
+
+
+def remote_head(repo_url, branch):
+    """
+    Retourne le commit de la branche sur le dépôt distant (un seul aller-retour, sans fetch),
+    ou None si la branche n'existe pas.
+    """
+    p = git(["ls-remote", "--heads", repo_url, f"refs/heads/{branch}"])
+    if p.returncode != 0:
+        raise RuntimeError(f"git ls-remote failed: {p.stderr}")
+    line = p.stdout.split("\n")[0]
+    return line.split()[0] if line else None
+
+
+def clone_options(depth, filter_spec, single_branch, reference):
+    """
+    Retourne les options de 'git clone' qui réduisent le transfert.
+    """
+    options = []
+    if depth:
+        # --depth implique --single-branch
+        options += ["--depth", str(depth)]
+    elif single_branch:
+        options.append("--single-branch")
+    if filter_spec:
+        options.append(f"--filter={filter_spec}")
+    if reference:
+        options += ["--reference", reference]
+    return options
+
+
+def reference_filter(reference, filter_spec, depth):
+    """
+    Retourne le filtre de clone partiel commun au miroir et aux checkouts qui l'empruntent.
+
+    Un checkout complet ne peut pas emprunter un miroir partiel (les fichiers absents du
+    miroir ne seraient jamais téléchargés) : le filtre d'un miroir partiel existant est repris.
+    Un nouveau miroir ne peut pas être superficiel ; avec depth, il est créé sans les fichiers
+    (blob:none) pour ne pas télécharger tout leur historique au premier démarrage.
+    """
+    if filter_spec:
+        return filter_spec
+    if os.path.isdir(reference):
+        p = git(["--git-dir", reference, "config", "--get", "remote.origin.partialclonefilter"])
+        return p.stdout.strip() or None
+    return "blob:none" if depth else None
+
+
+def update_reference(repo_url, reference, filter_spec=None):
+    """
+    Crée (git clone --mirror, partiel avec filter_spec) ou met à jour le miroir local servant
+    de magasin d'objets partagé. Un miroir partiel garde son filtre aux mises à jour.
+
+    Les checkouts empruntent ses objets (alternates) : le gc du miroir est désactivé, sinon
+    il pourrait supprimer après un force-push des objets dont un checkout a encore besoin.
+
+    Returns:
+        subprocess.CompletedProcess
+    """
+    exists = os.path.isdir(reference)
+    if not exists:
+        os.makedirs(os.path.dirname(reference.rstrip('/')) or '/', exist_ok=True)
+        options = [f"--filter={filter_spec}"] if filter_spec else []
+        p = git(["clone", "--mirror"] + options + [repo_url, reference])
+        if p.returncode != 0:
+            return p
+    # Aussi pour les miroirs créés avant cette protection
+    for key, value in (("gc.auto", "0"), ("gc.pruneExpire", "never")):
+        p = git(["--git-dir", reference, "config", key, value])
+        if p.returncode != 0:
+            return p
+    if not exists:
+        return p
+    return git(["--git-dir", reference, "remote", "update", "--prune"])
+
+
+def load_tag_map(target_dir, tag_map):
+    """
+    Lit le fichier de correspondance chemins -> tags du dépôt, None s'il n'existe pas.
+    """
+    path = os.path.join(target_dir, tag_map)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        mapping = yaml.safe_load(f) or {}
+    if not isinstance(mapping, dict):
+        raise ValueError(f"{tag_map} doit associer des motifs de chemins à des listes de tags")
+    return {pattern: [tags] if isinstance(tags, str) else list(tags or []) for pattern, tags in mapping.items()}
+
+
+def select_tags(target_dir, applied, after, tag_map):
+    """
+    Détermine les tags à exécuter d'après les fichiers modifiés entre le dernier commit
+    appliqué avec succès et after : les modifications d'une exécution échouée sont reprises.
+
+    Returns:
+        tuple: (tags, raison) ; tags vaut None pour une exécution complète,
+               une liste vide quand aucun fichier modifié ne demande d'exécution.
+    """
+    if applied is None:
+        return None, "aucun commit appliqué connu"
+    if applied == after:
+        return None, "commit déjà appliqué, exécution forcée"
+    mapping = load_tag_map(target_dir, tag_map)
+    if mapping is None:
+        return None, f"pas de fichier {tag_map}"
+    if git(["cat-file", "-e", f"{applied}^{{commit}}"], cwd=target_dir).returncode != 0:
+        return None, f"commit appliqué {applied[:12]} absent (clone superficiel)"
+    p = git(["diff", "--name-only", "--no-renames", applied, after], cwd=target_dir)
+    if p.returncode != 0:
+        return None, f"git diff impossible: {p.stderr.strip()}"
+    paths = [path for path in p.stdout.split("\n") if path]
+    tags = set()
+    for path in paths:
+        if path == tag_map:
+            return None, f"{tag_map} modifié"
+        matched = [pattern for pattern in mapping if fnmatch.fnmatch(path, pattern)]
+        if not matched:
+            return None, f"{path} n'est associé à aucun tag"
+        for pattern in matched:
+            tags.update(mapping[pattern])
+    return sorted(tags), f"{len(paths)} fichier(s) modifié(s), tous associés à des tags"
+
+
+def parse_time(value):
+    """
+    Convertit un horodatage ISO 8601 du callback JSON ('...Z') en datetime, None s'il est invalide.
+    """
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+
+class PlaybookRecap:
+    """
+    Construit le récapitulatif d'une exécution à partir de sa sortie, ligne par ligne.
+
+    Les lignes du callback ansible.posix.jsonl donnent les durées des tâches et les compteurs
+    (événement v2_playbook_on_stats) ; avec les autres callbacks, les compteurs viennent de la ligne PLAY RECAP.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.tasks = {}
+
+    def feed(self, line):
+        if line.startswith("{"):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                return
+            if isinstance(event, dict):
+                self.feed_event(event)
+            return
+        match = RECAP_LINE.match(line.strip())
+        if match:
+            for pair in match.group(2).split():
+                key, value = pair.split("=")
+                key = "failed" if key == "failures" else key
+                self.counts[key] = self.counts.get(key, 0) + int(value)
+
+    def feed_event(self, event):
+        for play in event.get("plays", []):
+            for task in play.get("tasks", []):
+                self.add_task(task.get("task", {}))
+        if "task" in event:
+            self.add_task(event["task"])
+        for host_stats in (event.get("stats") or {}).values():
+            for key, value in host_stats.items():
+                key = "failed" if key == "failures" else key
+                self.counts[key] = self.counts.get(key, 0) + value
+
+    def add_task(self, task):
+        duration = task.get("duration") or {}
+        start, end = parse_time(duration.get("start")), parse_time(duration.get("end"))
+        if start and end and task.get("id"):
+            self.tasks[task["id"]] = (task.get("name", ""), (end - start).total_seconds())
+
+    def result(self):
+        slowest = sorted(self.tasks.values(), key=lambda task: task[1], reverse=True)[:RECAP_TASKS]
+        return dict(self.counts, tasks=[dict(name=name, duration=round(seconds, 3)) for name, seconds in slowest])
+
+
+def callback_available(name):
+    """
+    Indique si le callback de sortie est installé sur la cible (ansible-doc -t callback -l).
+    """
+    try:
+        p = subprocess.run(["ansible-doc", "-t", "callback", "-l"], capture_output=True, text=True, check=False)
+    except OSError:
+        return False
+    names = {line.split()[0] for line in p.stdout.split("\n") if line.strip()}
+    short = name[len("ansible.builtin."):] if name.startswith("ansible.builtin.") else name
+    return name in names or short in names or f"ansible.builtin.{short}" in names
+
+
+def playbook_logger(log_file, max_bytes, backups):
+    """
+    Retourne un logger qui écrit les lignes telles quelles dans log_file, archivé au-delà de max_bytes.
+    """
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger = logging.getLogger("centos_pull.playbook")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers = [handler]
+    return logger
+
+
+def stream_playbook(command, cwd, env, logger, tail_lines):
+    """
+    Lance le playbook en écrivant sa sortie (stdout et stderr) dans le journal au fil de l'eau.
+
+    Seules les tail_lines dernières lignes (tronquées) sont gardées en mémoire.
+
+    Returns:
+        tuple: (code de retour, dernières lignes, récapitulatif)
+    """
+    tail = deque(maxlen=tail_lines)
+    recap = PlaybookRecap()
+    logger.info("=== %s %s", datetime.now().isoformat(timespec="seconds"), " ".join(command))
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               text=True, errors="replace")
+    with process.stdout:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            logger.info(line)
+            recap.feed(line)
+            tail.append(line[:TAIL_LINE_LENGTH])
+    for handler in logger.handlers:
+        handler.flush()
+    return process.wait(), "\n".join(tail), recap.result()
+
+
+def applied_ref(tags):
+    """
+    Retourne la référence du commit appliqué pour les tags demandés : une exécution limitée
+    à certains tags n'applique pas les autres, chaque ensemble de tags a donc la sienne.
+    """
+    if not tags:
+        return APPLIED_REF
+    digest = hashlib.sha1(",".join(sorted(set(tags))).encode()).hexdigest()[:16]
+    return f"{APPLIED_TAGS_REF}/{digest}"
+
+
+def applied_commit(target_dir, ref=APPLIED_REF):
+    """
+    Retourne le dernier commit appliqué avec succès (d'après ref), None s'il n'est pas connu.
+    """
+    if not os.path.isdir(os.path.join(target_dir, ".git")):
+        return None
+    p = git(["rev-parse", "-q", "--verify", f"{ref}^{{commit}}"], cwd=target_dir)
+    return (p.stdout.strip() or None) if p.returncode == 0 else None
+
+
+def mark_applied(module, target_dir, result, ref=APPLIED_REF):
+    """
+    Enregistre le commit courant comme appliqué avec succès dans ref.
+    """
+    repo_state = result['repo_state']
+    p = git(["update-ref", ref, repo_state['after']], cwd=target_dir)
+    if p.returncode == 0:
+        repo_state['applied'] = repo_state['after']
+    else:
+        module.warn(f"Impossible d'enregistrer le commit appliqué: {p.stderr.strip()}")
+
+
+def local_head(target_dir):
+    """
+    Retourne (commit, branche) du HEAD local, (None, None) si le dépôt n'existe pas.
+    """
+    if not os.path.isdir(os.path.join(target_dir, ".git")):
+        return None, None
+    commit = git(["rev-parse", "HEAD"], cwd=target_dir)
+    branch = git(["symbolic-ref", "--short", "-q", "HEAD"], cwd=target_dir)
+    return (commit.stdout.strip() or None) if commit.returncode == 0 else None, branch.stdout.strip() or None
+
 
 # ==============================================================================
 # MAIN EXECUTION
@@ -56,7 +521,19 @@ def main():
             target_dir=dict(type='str', required=True),
             playbook_name=dict(type='str', required=True),
             branch=dict(type='str', required=False, default='main'),
-            #tags=dict(type='list', required=False, default=[]),
+            tags=dict(type='list', elements='str', required=False, default=[]),
+            tag_map=dict(type='str', required=False, default='.pull_tags.yml'),
+            force_playbook=dict(type='bool', required=False, default=False),
+            depth=dict(type='int', required=False, default=0),
+            filter=dict(type='str', required=False),
+            single_branch=dict(type='bool', required=False, default=False),
+            reference=dict(type='path', required=False),
+            output_mode=dict(type='str', required=False, default='capture', choices=['capture', 'stream']),
+            log_file=dict(type='path', required=False),
+            log_max_bytes=dict(type='int', required=False, default=10 * 1024 * 1024),
+            log_backups=dict(type='int', required=False, default=5),
+            output_tail=dict(type='int', required=False, default=100),
+            stdout_callback=dict(type='str', required=False),
         ),
         supports_check_mode=True
     )
@@ -65,90 +542,176 @@ def main():
     target_dir = module.params['target_dir']
     playbook_name = module.params['playbook_name']
     branch = module.params['branch']
-    #tags = module.params['tags']
+    force_playbook = module.params['force_playbook']
+    depth = module.params['depth']
+    filter_spec = module.params['filter']
+    reference = module.params['reference']
+    requested = module.params['tags']
+    scope_ref = applied_ref(requested)
 
     # État initial
     result = dict(
         changed=False,
         msg='',
-        repo_state='unchanged',
+        repo_state=dict(state='unchanged', branch=branch, before=None, after=None, remote=None, applied=None),
+        tag_selection=dict(tags=None, reason=''),
+        playbook_run=False,
         playbook_output=''
     )
-    clone_cmd = f"git clone -b {branch} {repo_url} {target_dir}"
-    p = subprocess.run(clone_cmd, shell=True, capture_output=True, text=True, check=False)
-    # Vérification : Le répertoire .git est-il déjà présent dans la cible ?
-    repo_exists = os.path.isdir(target_dir)
+    repo_state = result['repo_state']
 
     # -------------------------------------------------------------------------
-    # 1. Gérer le dépôt (Clone ou Pull)
+    # 1. Comparer la tête distante avec le HEAD local (sans fetch)
     # -------------------------------------------------------------------------
+    try:
+        remote = remote_head(repo_url, branch)
+    except RuntimeError as e:
+        module.fail_json(**dict(result, msg=str(e)))
+    if remote is None:
+        module.fail_json(**dict(result, msg=f"La branche {branch} n'existe pas sur {repo_url}"))
+    before, current_branch = local_head(target_dir)
+    applied = applied_commit(target_dir, scope_ref)
+    repo_state.update(before=before, after=before, remote=remote, applied=applied)
 
-    if not repo_exists:
+    if before == remote and current_branch == branch and applied == before and not force_playbook:
+        # Rien n'a changé et ce commit a déjà été appliqué : ni fetch, ni playbook
+        result['msg'] = f"Dépôt déjà à jour ({remote[:12]}), playbook non exécuté."
+        module.exit_json(**result)
+
+    # -------------------------------------------------------------------------
+    # 2. Gérer le dépôt (Clone ou Fetch)
+    # -------------------------------------------------------------------------
+
+    if before is None:
         # Clone
         if module.check_mode:
-            module.exit_json(changed=True, msg=f"Would clone {repo_url} into {target_dir}")
+            module.exit_json(**dict(result, changed=True, msg=f"Would clone {repo_url} into {target_dir}"))
 
-        # Créer le répertoire si nécessaire
+        # Créer le répertoire parent si nécessaire
         try:
-            os.makedirs(target_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(target_dir.rstrip('/')) or '/', exist_ok=True)
         except OSError as e:
-            module.fail_json(msg=f"Impossible de créer le répertoire cible {target_dir}: {e}", **result)
-
-        clone_cmd = f"git clone -b {branch} {repo_url} {target_dir}"
+            module.fail_json(**dict(result, msg=f"Impossible de créer le répertoire cible {target_dir}: {e}"))
 
-        p = subprocess.run(clone_cmd, shell=True, capture_output=True, text=True, check=False)
+        if reference:
+            mirror_filter = reference_filter(reference, filter_spec, depth)
+            if mirror_filter != filter_spec:
+                module.warn(f"Miroir {reference} partiel : clone avec --filter={mirror_filter}.")
+                filter_spec = mirror_filter
+            p = update_reference(repo_url, reference, filter_spec)
+            if p.returncode != 0:
+                module.fail_json(**dict(result, msg=f"Mise à jour du miroir {reference} échouée: {p.stderr}"))
 
+        options = clone_options(depth, filter_spec, module.params['single_branch'], reference)
+        p = git(["clone", "--branch", branch] + options + [repo_url, target_dir])
         if p.returncode != 0:
-            module.fail_json(msg=f"Clone failed: {p.stderr}", stdout=p.stdout, **result)
+            module.fail_json(**dict(result, msg=f"Clone failed: {p.stderr}", stdout=p.stdout))
 
-        result['changed'] = True
-        result['repo_state'] = 'cloned'
+        repo_state['state'] = 'cloned'
         result['msg'] += f"Dépôt cloné sur {target_dir}. "
 
-    else:
-        # Pull (dépôt existe)
+    elif before != remote or current_branch != branch:
+        # Fetch de la seule branche suivie, puis fast-forward
         if module.check_mode:
-            module.exit_json(changed=True, msg=f"Would pull branch {branch} in {target_dir}")
+            module.exit_json(**dict(result, changed=True, msg=f"Would update branch {branch} in {target_dir}"))
 
-        # Checkout/Pull
-        pull_cmd = f"cd {target_dir} && git fetch && git checkout {branch} && git pull"
+        if reference:
+            p = update_reference(repo_url, reference, reference_filter(reference, filter_spec, depth))
+            if p.returncode != 0:
+                module.fail_json(**dict(result, msg=f"Mise à jour du miroir {reference} échouée: {p.stderr}"))
 
-        p = subprocess.run(pull_cmd, shell=True, capture_output=True, text=True, check=False, cwd=target_dir)
+        fetch = ["fetch", "origin", f"+refs/heads/{branch}:refs/remotes/origin/{branch}"]
+        if depth:
+            # Un clone superficiel n'a pas l'historique commun : pas de fast-forward, on se place sur la tête distante
+            steps = (fetch[:1] + ["--depth", str(depth)] + fetch[1:], ["checkout", "-B", branch, f"origin/{branch}"])
+        else:
+            steps = (fetch, ["checkout", branch], ["merge", "--ff-only", f"origin/{branch}"])
+        for args in steps:
+            p = git(args, cwd=target_dir)
+            if p.returncode != 0:
+                module.fail_json(**dict(result, msg=f"git {args[0]} failed: {p.stderr}", stdout=p.stdout))
 
-        if p.returncode != 0:
-            module.fail_json(msg=f"Pull failed: {p.stderr}", stdout=p.stdout, **result)
+        repo_state['state'] = 'updated'
+        result['msg'] += f"Dépôt mis à jour dans {target_dir}. "
 
-        # Analyse de la sortie pour déterminer si l'état a changé
-        if "Already up to date" not in p.stdout and "Already on" not in p.stdout and "up to date" not in p.stdout:
-            result['changed'] = True
-            result['repo_state'] = 'updated'
-            result['msg'] += f"Dépôt mis à jour dans {target_dir}. "
-        else:
-            result['msg'] += f"Dépôt déjà à jour. "
+    elif applied != before:
+        result['msg'] += f"Dépôt déjà à jour, commit {before[:12]} pas encore appliqué. "
+
+    else:
+        result['msg'] += "Dépôt déjà à jour. "
+
+    repo_state['after'] = local_head(target_dir)[0]
+    result['changed'] = repo_state['before'] != repo_state['after']
 
     # -------------------------------------------------------------------------
-    # 2. Exécuter le Playbook local
+    # 3. Exécuter le Playbook local
     # -------------------------------------------------------------------------
 
     playbook_path = os.path.join(target_dir, playbook_name)
     if not os.path.exists(playbook_path):
-        module.fail_json(msg=f"Playbook {playbook_name} non trouvé dans {target_dir}", **result)
+        module.fail_json(**dict(result, msg=f"Playbook {playbook_name} non trouvé dans {target_dir}"))
+
+    # Seuls les tags touchés par le diff (et demandés par l'option tags) sont exécutés
+    try:
+        run_tags, reason = select_tags(target_dir, repo_state['applied'], repo_state['after'], module.params['tag_map'])
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        run_tags, reason = None, f"{module.params['tag_map']} illisible: {e}"
+    if requested:
+        run_tags = requested if run_tags is None else [tag for tag in run_tags if tag in requested]
+    result['tag_selection'] = dict(tags=run_tags, reason=reason)
+
+    if run_tags == []:
+        result['msg'] += f"Aucun tag concerné par les modifications ({reason}), playbook non exécuté."
+        if not module.check_mode:
+            mark_applied(module, target_dir, result, scope_ref)
+        module.exit_json(**result)
 
-    tags_arg = f"--tags {','.join(tags)}" if tags else ""
+    if module.check_mode:
+        module.exit_json(**dict(result, changed=True, msg=f"Would run {playbook_name}"))
 
     # Exécuter le playbook interne avec connexion locale (-c local)
-    playbook_cmd = f"ansible-playbook {playbook_name} -c local {tags_arg}"
+    playbook_cmd = ["ansible-playbook", playbook_name, "-c", "local"]
+    if run_tags:
+        playbook_cmd += ["--tags", ",".join(run_tags)]
 
-    p = subprocess.run(playbook_cmd, shell=True, capture_output=True, text=True, check=False, cwd=target_dir)
+    try:
+        if module.params['output_mode'] == 'stream':
+            log_file = module.params['log_file'] or os.path.join(
+                '/var/log/centos_pull', os.path.basename(target_dir.rstrip('/')) + '.log')
+            result['playbook_log'] = log_file
+            logger = playbook_logger(log_file, module.params['log_max_bytes'], module.params['log_backups'])
+            env = dict(os.environ)
+            callback = module.params['stdout_callback']
+            if callback and callback_available(callback):
+                env['ANSIBLE_STDOUT_CALLBACK'] = callback
+            elif callback:
+                # Sans lui ansible-playbook s'arrêterait sur "Invalid callback for stdout specified"
+                module.warn(f"Callback {callback} absent de la cible, callback configuré utilisé "
+                            "(récapitulatif lu dans PLAY RECAP).")
+            returncode, output, recap = stream_playbook(playbook_cmd, target_dir, env, logger,
+                                                        module.params['output_tail'])
+        else:
+            p = subprocess.run(playbook_cmd, capture_output=True, text=True, check=False, cwd=target_dir)
+            returncode, output = p.returncode, p.stdout
+            if p.returncode != 0:
+                output += p.stderr
+            recap = PlaybookRecap()
+            for line in p.stdout.split("\n"):
+                recap.feed(line)
+            recap = recap.result()
+    except OSError as e:
+        module.fail_json(**dict(result, msg=f"Impossible de lancer ansible-playbook: {e}"))
+    result['playbook_run'] = True
+    result['playbook_output'] = output
+    result['playbook_recap'] = recap
 
-    if p.returncode != 0:
+    if returncode != 0:
         # Échec de l'exécution du playbook local
-        result['playbook_output'] = p.stdout + p.stderr
-        module.fail_json(msg=f"Exécution du playbook {playbook_name} échouée. Code de retour: {p.returncode}", **result)
+        module.fail_json(**dict(result, msg=f"Exécution du playbook {playbook_name} échouée. Code de retour: {returncode}"))
 
-    # Succès
-    result['playbook_output'] = p.stdout
-    result['changed'] = True  # On marque toujours comme changé après une exécution de playbook
+    # Succès : le commit est appliqué (pour ces tags), les exécutions suivantes peuvent s'arrêter au ls-remote
+    mark_applied(module, target_dir, result, scope_ref)
+    result['changed'] = True  # Le playbook n'est exécuté que si le dépôt a changé (ou force_playbook)
     result['msg'] += f"Playbook {playbook_name} exécuté avec succès."
 
     module.exit_json(**result)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Times the latest_version filter of filter_plugins/my_filters.py on 1k, 10k and 100k tags:
+the first call (memo miss) against the next ones (memo hits). As in a play, each of
+the next calls runs in a new worker process (--forks of them at a time), so the hits
+come from the memo shared on disk, not from the memory of the process.
+
+    python3 bench_latest_version.py [--sizes 1000 10000 100000] [--repeats 100] [--forks 10]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# A memo of its own: the benchmark clears it, and removes it at the end
+BENCH_CACHE_DIR = tempfile.mkdtemp(prefix="bench_latest_version.")
+os.environ["LATEST_VERSION_CACHE_DIR"] = BENCH_CACHE_DIR
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "filter_plugins"))
+from my_filters import FilterModule, latest_version_cache  # noqa: E402
+
+latest_version = FilterModule().filters()['latest_version']
+# Tag list of the current size, inherited by the forked workers
+tags = ""
+
+
+def make_tags(count):
+    """Returns `count` registry-like tags, in random order, as one newline separated string."""
+    tags = [f"v{major}.{minor}" + random.choice(["", f"-rc{minor % 3 + 1}", f".{minor % 7}"])
+            for major, minor in ((10 + i // 100, i % 100) for i in range(count))]
+    random.shuffle(tags)
+    return "\n".join(tags)
+
+
+def timed_call(_):
+    """One host: templates the tag list in a worker process, returns the time in ms."""
+    started = time.perf_counter()
+    latest_version(tags)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    global tags
+    parser = argparse.ArgumentParser(description="Benchmark of the latest_version filter memo.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeats', type=int, default=100, help='calls with the same list (hosts of a play)')
+    parser.add_argument('--forks', type=int, default=10, help='worker processes running at the same time')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    print(f"{'tags':>8}{'miss (ms)':>11}{'hit p50 (ms)':>14}{'speed-up':>10}  result")
+    for size in args.sizes:
+        tags = make_tags(size)
+        latest_version_cache.clear()
+        started = time.perf_counter()
+        result = latest_version(tags)
+        miss = (time.perf_counter() - started) * 1000
+        # maxtasksperchild=1: a new process per call, like the Ansible workers
+        with context.Pool(args.forks, maxtasksperchild=1) as pool:
+            hits = pool.map(timed_call, range(args.repeats), chunksize=1)
+        hit = statistics.median(hits)
+        print(f"{size:>8}{miss:>11.2f}{hit:>14.3f}{miss / hit:>9.0f}x  {result}")
+        print(f"{'':>8}{latest_version_cache.info()}")
+    shutil.rmtree(BENCH_CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
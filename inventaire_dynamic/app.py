@@ -1,9 +1,50 @@
 import docker
-from flask import Flask, render_template_string
+from flask import Flask, Response, request
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import collections
+import hashlib
+import json
+import os
+import queue
 import sys
+import threading
+import time
 
 app = Flask(__name__)
 
+# --- Configuration ---
+# Seconds a scan result is served to every browser before the daemon is asked again
+SCAN_TTL = float(os.environ.get("SCANNER_SCAN_TTL", "2"))
+# Seconds between two pings of the pooled client
+HEALTH_CHECK_INTERVAL = float(os.environ.get("SCANNER_HEALTH_CHECK_INTERVAL", "30"))
+DOCKER_TIMEOUT = 10
+# Docker calls of the requests run in this many threads at most, whatever the number of requests
+DOCKER_WORKERS = int(os.environ.get("SCANNER_DOCKER_WORKERS", "4"))
+# Stats collector: samples kept per container (one per second), and containers followed at most,
+# which bounds its memory to about STATS_HISTORY * STATS_MAX_CONTAINERS samples
+STATS_HISTORY = int(os.environ.get("SCANNER_STATS_HISTORY", "60"))
+STATS_MAX_CONTAINERS = int(os.environ.get("SCANNER_STATS_MAX_CONTAINERS", "200"))
+# Seconds between two checks of the running containers by the collector
+STATS_REFRESH_INTERVAL = 10
+# Production server (--production)
+SERVER_THREADS = int(os.environ.get("SCANNER_THREADS", "32"))
+SERVER_WORKERS = int(os.environ.get("SCANNER_WORKERS", "1"))
+# Page size of the container lists, and its upper bound
+PER_PAGE = 50
+MAX_PER_PAGE = 500
+SORT_FIELDS = ('name', 'image', 'status', 'ports')
+# Container events that change a row of the table, "destroy" removes it
+FEED_ACTIONS = ('create', 'start', 'restart', 'die', 'stop', 'kill', 'pause', 'unpause', 'rename', 'destroy')
+# Deltas a browser may be late by before it is disconnected (it reconnects and gets a new snapshot)
+SUBSCRIBER_BACKLOG = 1000
+# Seconds between two keep-alive comments on an idle event stream
+KEEPALIVE_INTERVAL = 15
+# Open /api/events streams at most. Each one holds a server thread for as long as the page is open,
+# so in production they are capped below the thread count (0: half of the threads) and the other
+# requests always find a free thread; beyond the cap, /api/events answers 503.
+EVENT_STREAMS = int(os.environ.get("SCANNER_EVENT_STREAMS", "0"))
+
 # Full HTML template for the main page
 MAIN_PAGE_TEMPLATE = """
 <!DOCTYPE html>
@@ -115,6 +156,14 @@ MAIN_PAGE_TEMPLATE = """
             <button id="scan-button" class="bg-blue-600 hover:bg-blue-700 text-white font-semibold py-3 px-6 rounded-full shadow-lg">
                 Scan for Containers
             </button>
+            <button id="live-button" class="bg-green-600 hover:bg-green-700 text-white font-semibold py-2 px-6 rounded-full shadow-lg">
+                Live updates
+            </button>
+            <button id="metrics-button" class="bg-gray-600 hover:bg-gray-700 text-white font-semibold py-2 px-6 rounded-full shadow-lg">
+                Metrics
+            </button>
+            <input id="name-filter" type="text" placeholder="Filter by name"
+                   class="border border-gray-300 rounded-full py-2 px-4 w-64">
             <div id="loading-indicator" class="loading-indicator">
                 <span class="spinner"></span>
                 <span class="ml-2">Scanning...</span>
@@ -127,10 +176,17 @@ MAIN_PAGE_TEMPLATE = """
     </div>
 
     <script>
-        document.getElementById('scan-button').addEventListener('click', async () => {
+        async function loadPage(page) {
+            if (liveSource) {
+                toggleLive();
+            }
             const resultsDiv = document.getElementById('results');
             const loadingIndicator = document.getElementById('loading-indicator');
             const scanButton = document.getElementById('scan-button');
+            const params = new URLSearchParams({
+                page: page,
+                name: document.getElementById('name-filter').value
+            });
 
             resultsDiv.innerHTML = '';
             loadingIndicator.style.display = 'flex';
@@ -138,7 +194,7 @@ MAIN_PAGE_TEMPLATE = """
             scanButton.classList.add('opacity-50', 'cursor-not-allowed');
 
             try {
-                const response = await fetch('/api/scan');
+                const response = await fetch(`/api/scan?${params}`);
                 if (!response.ok) {
                     throw new Error(`HTTP error! status: ${response.status}`);
                 }
@@ -153,6 +209,139 @@ MAIN_PAGE_TEMPLATE = """
                 scanButton.disabled = false;
                 scanButton.classList.remove('opacity-50', 'cursor-not-allowed');
             }
+        }
+
+        // Live view: the table follows /api/events, which pushes the changes of the containers
+        let liveSource = null;
+        const liveContainers = new Map();
+
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text;
+            return div.innerHTML;
+        }
+
+        function renderLive() {
+            const filter = document.getElementById('name-filter').value;
+            const rows = [...liveContainers.values()]
+                .filter((container) => container.name.includes(filter))
+                .sort((a, b) => a.name.localeCompare(b.name))
+                .map((container) => `
+                    <tr>
+                        <td class="container-name">${escapeHtml(container.name)}</td>
+                        <td>${escapeHtml(container.image)}</td>
+                        <td><span class="status-badge status-${container.status === 'running' ? 'running' : 'exited'}">${escapeHtml(container.status)}</span></td>
+                        <td>${escapeHtml(container.ports)}</td>
+                    </tr>`);
+            document.getElementById('results').innerHTML = `
+                <table class="table-auto rounded-xl overflow-hidden">
+                    <thead>
+                        <tr class="rounded-xl">
+                            <th class="rounded-tl-xl">Container Name</th>
+                            <th>Image</th>
+                            <th>Status</th>
+                            <th class="rounded-tr-xl">Ports</th>
+                        </tr>
+                    </thead>
+                    <tbody>${rows.join('') || '<tr><td colspan="4">No active containers found.</td></tr>'}</tbody>
+                </table>`;
+        }
+
+        function toggleLive() {
+            const liveButton = document.getElementById('live-button');
+            if (liveSource) {
+                liveSource.close();
+                liveSource = null;
+                liveButton.textContent = 'Live updates';
+                return;
+            }
+            liveButton.textContent = 'Stop live updates';
+            // EventSource reconnects by itself, the server then starts with a new snapshot
+            liveSource = new EventSource('/api/events');
+            liveSource.onerror = () => {
+                // A refused stream (503: too many live pages) is not retried by the browser
+                if (liveSource && liveSource.readyState === EventSource.CLOSED) {
+                    liveSource = null;
+                    liveButton.textContent = 'Live updates (busy, try again later)';
+                    loadPage(1);
+                }
+            };
+            liveSource.onmessage = (message) => {
+                const delta = JSON.parse(message.data);
+                if (delta.type === 'snapshot') {
+                    liveContainers.clear();
+                    delta.containers.forEach((container) => liveContainers.set(container.id, container));
+                } else if (delta.type === 'upsert') {
+                    liveContainers.set(delta.container.id, delta.container);
+                } else if (delta.type === 'remove') {
+                    liveContainers.delete(delta.id);
+                }
+                renderLive();
+            };
+        }
+
+        // Metrics view: last sample of the stats collector for every running container
+        function formatBytes(bytes) {
+            const units = ['B', 'KiB', 'MiB', 'GiB', 'TiB'];
+            let unit = 0;
+            while (bytes >= 1024 && unit < units.length - 1) {
+                bytes /= 1024;
+                unit++;
+            }
+            return `${bytes.toFixed(unit ? 1 : 0)} ${units[unit]}`;
+        }
+
+        async function loadMetrics() {
+            if (liveSource) {
+                toggleLive();
+            }
+            const resultsDiv = document.getElementById('results');
+            try {
+                const response = await fetch('/api/stats');
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                const stats = Object.values(await response.json()).sort((a, b) => a.name.localeCompare(b.name));
+                const rows = stats.map((sample) => `
+                    <tr>
+                        <td class="container-name">${escapeHtml(sample.name)}</td>
+                        <td>${sample.cpu_percent.toFixed(1)} %</td>
+                        <td>${formatBytes(sample.memory_bytes)} / ${formatBytes(sample.memory_limit)}</td>
+                        <td>${formatBytes(sample.net_rx_bytes)} / ${formatBytes(sample.net_tx_bytes)}</td>
+                        <td>${formatBytes(sample.block_read_bytes)} / ${formatBytes(sample.block_write_bytes)}</td>
+                    </tr>`);
+                resultsDiv.innerHTML = `
+                    <table class="table-auto rounded-xl overflow-hidden">
+                        <thead>
+                            <tr class="rounded-xl">
+                                <th class="rounded-tl-xl">Container Name</th>
+                                <th>CPU</th>
+                                <th>Memory</th>
+                                <th>Net rx / tx</th>
+                                <th class="rounded-tr-xl">Block read / write</th>
+                            </tr>
+                        </thead>
+                        <tbody>${rows.join('') || '<tr><td colspan="5">Collecting metrics, try again in a few seconds.</td></tr>'}</tbody>
+                    </table>`;
+            } catch (error) {
+                console.error('Error fetching data:', error);
+                resultsDiv.innerHTML = `<p class="text-center text-red-500">Failed to load metrics: ${error.message}.</p>`;
+            }
+        }
+
+        document.getElementById('scan-button').addEventListener('click', () => loadPage(1));
+        document.getElementById('metrics-button').addEventListener('click', loadMetrics);
+        document.getElementById('live-button').addEventListener('click', toggleLive);
+        document.getElementById('name-filter').addEventListener('input', () => {
+            if (liveSource) {
+                renderLive();
+            }
+        });
+        // Previous/next buttons of the table
+        document.getElementById('results').addEventListener('click', (event) => {
+            if (event.target.dataset.page) {
+                loadPage(event.target.dataset.page);
+            }
         });
     </script>
 </body>
@@ -185,60 +374,523 @@ TABLE_TEMPLATE = """
         {% endfor %}
     </tbody>
 </table>
+{% if total > containers|length %}
+<div class="flex justify-center items-center space-x-4 mt-4 text-gray-600">
+    {% if page > 1 %}<button data-page="{{ page - 1 }}" class="underline">Previous</button>{% endif %}
+    <span>{{ (page - 1) * per_page + 1 }}-{{ (page - 1) * per_page + containers|length }} of {{ total }}</span>
+    {% if page * per_page < total %}<button data-page="{{ page + 1 }}" class="underline">Next</button>{% endif %}
+</div>
+{% endif %}
 """
 
+# Both templates are compiled once, at import time
+MAIN_PAGE = app.jinja_env.from_string(MAIN_PAGE_TEMPLATE)
+TABLE = app.jinja_env.from_string(TABLE_TEMPLATE)
+
+
+class DockerConnection:
+    """
+    One Docker client for the lifetime of the process.
+
+    The client (and the HTTP connection pool behind it) is created on first
+    use and reused by every request. It is pinged at most every
+    HEALTH_CHECK_INTERVAL seconds, and rebuilt when a ping or a call fails.
+    """
+
+    def __init__(self, health_check_interval=HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self.client = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns a healthy client, None if the daemon cannot be reached."""
+        with self.lock:
+            if self.client is not None and time.monotonic() - self.checked_at < self.health_check_interval:
+                return self.client
+            try:
+                if self.client is None:
+                    self.client = docker.from_env(timeout=DOCKER_TIMEOUT)
+                self.client.ping()
+                self.checked_at = time.monotonic()
+                return self.client
+            except docker.errors.DockerException as e:
+                print("Error: Unable to connect to the Docker daemon. Is Docker running?", file=sys.stderr)
+                print(f"Details: {e}", file=sys.stderr)
+            except Exception as e:
+                print(f"An unexpected error occurred during Docker connection test: {e}", file=sys.stderr)
+            self._drop()
+            return None
+
+    def reset(self, client):
+        """
+        Forgets the client after a failed call; the next get() reconnects.
+
+        Does nothing if another thread has already replaced the failed client:
+        the new one is shared by every thread and must not be closed.
+        """
+        with self.lock:
+            if client is not None and client is self.client:
+                self._drop()
+
+    def _drop(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+        self.client = None
+        self.checked_at = 0
+
+
+class ScanCache:
+    """
+    Result of the last scan, served for `ttl` seconds.
+
+    Concurrent requests arriving while the result is stale wait for a single
+    scan instead of each sending their own to the daemon.
+    """
+
+    def __init__(self, ttl=SCAN_TTL):
+        self.ttl = ttl
+        self.result = None
+        self.scanned_at = 0
+        self.lock = threading.Lock()
+
+    def get(self, scan):
+        with self.lock:
+            if self.result is None or time.monotonic() - self.scanned_at >= self.ttl:
+                self.result = scan()
+                self.scanned_at = time.monotonic()
+            return self.result
+
+
+docker_connection = DockerConnection()
+scan_cache = ScanCache()
+docker_executor = ThreadPoolExecutor(max_workers=DOCKER_WORKERS, thread_name_prefix="docker")
 
-def test_docker_connection():
+
+def run_docker(function, *args):
+    """
+    Runs a blocking docker-py call in the bounded executor and waits for it.
+
+    Request threads may be many (and mostly idle on SSE streams); the daemon
+    never sees more than DOCKER_WORKERS concurrent calls from the scanner.
+    """
+    return docker_executor.submit(function, *args).result(timeout=DOCKER_TIMEOUT * 3)
+
+
+def format_ports(ports):
+    """
+    Formats the published ports of the list payload as "public->private/type".
+    """
+    ports_list = []
+    for port in ports or []:
+        if port.get('PublicPort'):
+            mapping = f"{port['PublicPort']}->{port['PrivatePort']}/{port['Type']}"
+            # IPv4 and IPv6 bindings of the same port are shown once
+            if mapping not in ports_list:
+                ports_list.append(mapping)
+    return ", ".join(ports_list)
+
+
+def container_data(container):
+    """Returns the row of the table of a sparse container."""
+    return {
+        'id': container.attrs['Id'][:12],
+        'name': container.attrs['Names'][0].lstrip('/'),
+        'image': container.attrs.get('Image') or 'N/A',
+        'status': container.attrs.get('State', ''),
+        'ports': format_ports(container.attrs.get('Ports')),
+        'labels': container.attrs.get('Labels') or {}
+    }
+
+
+def scan_containers(filters=None):
+    """
+    Lists every container (or those matching the Docker filters) with a single API call.
+
+    Sparse containers carry the list payload as is: the image name, the
+    state and the ports come with it, without one inspect and one image
+    lookup per container.
+    """
+    client = docker_connection.get()
+    if client is None:
+        raise ConnectionError("Unable to connect to the Docker daemon.")
     try:
-        client = docker.from_env()
-        client.ping()
-        return client
-    except docker.errors.DockerException as e:
-        print(f"Error: Unable to connect to the Docker daemon. Is Docker running?", file=sys.stderr)
-        print(f"Details: {e}", file=sys.stderr)
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred during Docker connection test: {e}", file=sys.stderr)
-        return None
+        all_containers = client.containers.list(all=True, sparse=True, filters=filters)
+    except Exception:
+        # The daemon may have restarted: reconnect once
+        docker_connection.reset(client)
+        client = docker_connection.get()
+        if client is None:
+            raise
+        all_containers = client.containers.list(all=True, sparse=True, filters=filters)
+
+    return [container_data(container) for container in all_containers]
+
+
+class ContainerFeed:
+    """
+    Container table kept up to date from a single 'docker events' subscription.
+
+    The first subscriber starts a background thread that scans the daemon
+    once, then follows the container events and applies them to the table,
+    re-listing only the container named in an event. Every change is pushed
+    as a delta to the queue of each subscriber (browsers on /api/events), so
+    any number of dashboards costs one event stream on the daemon.
+    """
+
+    def __init__(self, max_subscribers=EVENT_STREAMS or None):
+        self.containers = {}
+        self.subscribers = []
+        # None: no limit (set by serve_production from the thread count)
+        self.max_subscribers = max_subscribers
+        self.started = False
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        """Returns the rows of the table, None until the first scan is done."""
+        with self.lock:
+            return list(self.containers.values()) if self.ready else None
+
+    def subscribe(self):
+        """
+        Returns (queue of deltas, current rows) of a new subscriber; the rows
+        are None while the first scan runs, its snapshot then comes through the queue.
+        The queue is None when max_subscribers streams are already open.
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self.lock:
+            if self.max_subscribers is not None and len(self.subscribers) >= self.max_subscribers:
+                return None, None
+            self.subscribers.append(subscriber)
+            if not self.started:
+                self.started = True
+                threading.Thread(target=self._follow, daemon=True).start()
+            return subscriber, list(self.containers.values()) if self.ready else None
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def _publish(self, delta):
+        # Called with the lock held
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.put_nowait(delta)
+            except queue.Full:
+                # Too slow a browser: ending its stream makes it reconnect with a fresh snapshot
+                self.subscribers.remove(subscriber)
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(None)
+
+    def _apply(self, event):
+        container_id = event.get('id', event.get('Actor', {}).get('ID', ''))[:12]
+        if event.get('Action', event.get('status')) == 'destroy':
+            rows = []
+        else:
+            rows = scan_containers({'id': container_id})
+        with self.lock:
+            if rows:
+                self.containers[container_id] = rows[0]
+                self._publish({'type': 'upsert', 'container': rows[0]})
+            elif self.containers.pop(container_id, None) is not None:
+                self._publish({'type': 'remove', 'id': container_id})
+
+    def _follow(self):
+        delay = 1
+        while True:
+            client = None
+            try:
+                client = docker_connection.get()
+                if client is None:
+                    raise ConnectionError("Unable to connect to the Docker daemon.")
+                # Events of containers changed during the scan are replayed from `since`
+                since = int(time.time())
+                containers = {container['id']: container for container in scan_containers()}
+                with self.lock:
+                    self.containers = containers
+                    self.ready = True
+                    self._publish({'type': 'snapshot', 'containers': list(containers.values())})
+                for event in client.events(decode=True, since=since, filters={'type': 'container'}):
+                    delay = 1
+                    if event.get('Action', event.get('status')) in FEED_ACTIONS:
+                        self._apply(event)
+            except Exception as e:
+                print(f"Docker event stream interrupted ({e}), resubscribing in {delay}s.", file=sys.stderr)
+                with self.lock:
+                    # Until the next snapshot, pages fall back to the memoized scan
+                    self.ready = False
+                docker_connection.reset(client)
+                time.sleep(delay)
+                delay = min(30, delay * 2)
+
+
+container_feed = ContainerFeed()
+
+
+def stats_sample(stats):
+    """
+    Returns the metrics of one 'docker stats' payload.
+
+    CPU usage is computed like 'docker stats' does, from the deltas with the
+    previous reading that the daemon sends along (precpu_stats).
+    """
+    cpu, precpu = stats.get('cpu_stats') or {}, stats.get('precpu_stats') or {}
+    cpu_delta = cpu.get('cpu_usage', {}).get('total_usage', 0) - precpu.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    cpu_percent = 0.0
+    if cpu_delta > 0 and system_delta > 0:
+        cpu_percent = cpu_delta / system_delta * cpu.get('online_cpus', 1) * 100
+    memory = stats.get('memory_stats') or {}
+    networks = (stats.get('networks') or {}).values()
+    block = (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []
+    return {
+        'time': time.time(),
+        'cpu_percent': round(cpu_percent, 2),
+        'memory_bytes': memory.get('usage', 0),
+        'memory_limit': memory.get('limit', 0),
+        'net_rx_bytes': sum(network.get('rx_bytes', 0) for network in networks),
+        'net_tx_bytes': sum(network.get('tx_bytes', 0) for network in networks),
+        'block_read_bytes': sum(entry.get('value', 0) for entry in block if entry.get('op', '').lower() == 'read'),
+        'block_write_bytes': sum(entry.get('value', 0) for entry in block if entry.get('op', '').lower() == 'write'),
+    }
+
+
+class StatsCollector:
+    """
+    Resource metrics of the running containers, collected in the background.
+
+    The daemon streams one stats payload per second and per container; one
+    thread per running container reads its stream (they all run at the same
+    time, where stats(stream=False) in a loop takes about a second per
+    container) into a ring buffer of STATS_HISTORY samples. At most
+    STATS_MAX_CONTAINERS containers are followed, so memory stays bounded.
+    """
+
+    def __init__(self, history=STATS_HISTORY, max_containers=STATS_MAX_CONTAINERS):
+        self.history = history
+        self.max_containers = max_containers
+        self.samples = {}
+        self.names = {}
+        self.client = None
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the collector on first use."""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def current(self):
+        """Returns the last sample of every followed container."""
+        with self.lock:
+            return {
+                container_id: dict(samples[-1], name=self.names[container_id])
+                for container_id, samples in self.samples.items() if samples
+            }
+
+    def history_of(self, container_id):
+        """Returns the samples of one container (oldest first), None if it is not followed."""
+        with self.lock:
+            samples = self.samples.get(container_id[:12])
+            return list(samples) if samples is not None else None
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                if self.client is None:
+                    # Every stats stream holds a connection: the pool must be as large as them
+                    self.client = docker.from_env(timeout=DOCKER_TIMEOUT, max_pool_size=self.max_containers)
+                running = [container for container in current_containers() if container['status'] == 'running']
+                with self.lock:
+                    # Containers that stopped: their stream has ended, forget them
+                    for container_id in set(self.samples) - {container['id'] for container in running}:
+                        del self.samples[container_id]
+                        del self.names[container_id]
+                    new = [container for container in running if container['id'] not in self.samples]
+                    new = new[:max(0, self.max_containers - len(self.samples))]
+                    for container in new:
+                        self.samples[container['id']] = collections.deque(maxlen=self.history)
+                        self.names[container['id']] = container['name']
+                for container in new:
+                    threading.Thread(target=self._follow, args=(container['id'],), daemon=True).start()
+            except Exception as e:
+                print(f"Stats collector: unable to list the containers ({e}).", file=sys.stderr)
+                self.client = None
+            time.sleep(STATS_REFRESH_INTERVAL)
+
+    def _follow(self, container_id):
+        with self.lock:
+            samples = self.samples.get(container_id)
+        try:
+            for stats in self.client.api.stats(container_id, stream=True, decode=True):
+                with self.lock:
+                    if self.samples.get(container_id) is not samples:
+                        # Forgotten by a refresh
+                        return
+                    samples.append(stats_sample(stats))
+        except Exception as e:
+            print(f"Stats collector: stream of {container_id} ended ({e}).", file=sys.stderr)
+        finally:
+            # The next refresh starts a new stream if the container still runs
+            with self.lock:
+                if self.samples.get(container_id) is samples:
+                    del self.samples[container_id]
+                    del self.names[container_id]
+
+
+stats_collector = StatsCollector()
+
+
+def current_containers():
+    """
+    Rows of the table: from the event feed while it runs (no daemon call),
+    else from the memoized scan.
+    """
+    containers = container_feed.snapshot()
+    if containers is None:
+        containers = scan_cache.get(lambda: run_docker(scan_containers))
+    return containers
+
+
+def select_containers(containers, args):
+    """
+    Filters, sorts and paginates scanned containers from query arguments.
+
+    Args:
+        containers (list): result of scan_containers().
+        args: query arguments:
+            status  comma separated states (running,exited...)
+            name    substring of the container name
+            label   "key" or "key=value", repeatable
+            sort    one of SORT_FIELDS, "-" in front for descending order
+            page, per_page
+
+    Returns:
+        tuple: (containers of the page, number of matching containers, page, per_page)
+    """
+    selected = containers
+    statuses = [status for status in args.get('status', '').split(',') if status]
+    if statuses:
+        selected = [container for container in selected if container['status'] in statuses]
+    name = args.get('name', '')
+    if name:
+        selected = [container for container in selected if name in container['name']]
+    for label in args.getlist('label'):
+        key, has_value, value = label.partition('=')
+        selected = [container for container in selected
+                    if key in container['labels'] and (not has_value or container['labels'][key] == value)]
+
+    sort = args.get('sort', 'name')
+    field = sort.lstrip('-')
+    if field in SORT_FIELDS:
+        selected = sorted(selected, key=lambda container: container[field], reverse=sort.startswith('-'))
+
+    per_page = min(MAX_PER_PAGE, max(1, args.get('per_page', PER_PAGE, type=int)))
+    page = max(1, args.get('page', 1, type=int))
+    start = (page - 1) * per_page
+    return selected[start:start + per_page], len(selected), page, per_page
 
 
 @app.route('/')
 def main_page():
-    return render_template_string(MAIN_PAGE_TEMPLATE)
+    return MAIN_PAGE.render()
 
 
-@app.route('/api/scan')
-def get_docker_containers():
-    client = test_docker_connection()
-    if client is None:
-        return "<h1>Error: Unable to connect to the Docker daemon.</h1><p>Please ensure the Docker service is running.</p>"
+@app.route('/api/containers')
+def api_containers():
+    """
+    Scanned containers as JSON, with the filters and the pagination of select_containers().
 
+    The ETag is a digest of the answer: a browser sending it back in
+    If-None-Match gets a 304 without a body while nothing changed.
+    """
     try:
-        all_containers = client.containers.list(all=True)
-
-        containers_data = []
-        for container in all_containers:
-            ports_list = []
-            if container.ports:
-                for k, v in container.ports.items():
-                    if v:
-                        for binding in v:
-                            public_port = binding.get('HostPort', '')
-                            private_port = k.split('/')[0]
-                            port_type = k.split('/')[1]
-                            ports_list.append(f"{public_port}->{private_port}/{port_type}")
-
-            ports_str = ", ".join(ports_list)
-
-            containers_data.append({
-                'name': container.name,
-                'image': container.image.tags[0] if container.image.tags else 'N/A',
-                'status': container.status,
-                'ports': ports_str
-            })
-
-        return render_template_string(TABLE_TEMPLATE, containers=containers_data)
+        containers = current_containers()
+    except Exception as e:
+        return app.response_class(json.dumps({"error": str(e)}), status=503, mimetype='application/json')
+
+    page_containers, total, page, per_page = select_containers(containers, request.args)
+    body = json.dumps({
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "containers": page_containers
+    }, sort_keys=True)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode()).hexdigest())
+    return response.make_conditional(request)
+
+
+@app.route('/api/stats')
+def api_stats():
+    """
+    Last CPU, memory, network and block I/O sample of every running container.
+
+    The first call starts the collector; samples come in about a second later.
+    """
+    stats_collector.start()
+    return app.response_class(json.dumps(stats_collector.current(), sort_keys=True), mimetype='application/json')
+
+
+@app.route('/api/stats/<container_id>')
+def api_container_stats(container_id):
+    """Samples of the last STATS_HISTORY seconds of one container."""
+    stats_collector.start()
+    samples = stats_collector.history_of(container_id)
+    if samples is None:
+        return app.response_class(json.dumps({"error": f"No stats for container {container_id}"}), status=404,
+                                  mimetype='application/json')
+    return app.response_class(json.dumps(samples), mimetype='application/json')
+
+
+@app.route('/api/events')
+def api_events():
+    """
+    Server-Sent Events stream of the container table.
+
+    A 'snapshot' event with every row comes first, then 'upsert' and
+    'remove' deltas as containers change.
+    """
+    subscriber, containers = container_feed.subscribe()
+    if subscriber is None:
+        # Every stream holds a server thread: past the cap the page falls back to polling
+        return app.response_class(json.dumps({"error": "Too many live pages open, try again later."}),
+                                  status=503, mimetype='application/json', headers={'Retry-After': '60'})
+
+    def stream():
+        try:
+            if containers is not None:
+                yield f"data: {json.dumps({'type': 'snapshot', 'containers': containers})}\n\n"
+            while True:
+                try:
+                    delta = subscriber.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if delta is None:
+                    return
+                yield f"data: {json.dumps(delta)}\n\n"
+        finally:
+            container_feed.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 
+@app.route('/api/scan')
+def get_docker_containers():
+    try:
+        containers_data = current_containers()
+    except ConnectionError:
+        return "<h1>Error: Unable to connect to the Docker daemon.</h1><p>Please ensure the Docker service is running.</p>"
     except Exception as e:
         error_message = f"<h1>Error: Unable to retrieve container list.</h1>" \
                         f"<p>An unexpected error occurred:</p>" \
@@ -246,6 +898,64 @@ def get_docker_containers():
                         f"<p>Please check your Docker daemon's status and logs for more information.</p>"
         return error_message
 
+    page_containers, total, page, per_page = select_containers(containers_data, request.args)
+    return TABLE.render(containers=page_containers, total=total, page=page, per_page=per_page)
+
+
+def serve_production(host, port, threads=SERVER_THREADS, workers=SERVER_WORKERS):
+    """
+    Serves the app with waitress, or gunicorn, whichever is installed.
+
+    Both are optional: without them, the threaded Werkzeug server is used
+    (without the debugger). Each gunicorn worker has its own Docker client,
+    scan cache and event feed, so a single worker with many threads is the
+    default.
+
+    Both servers have a fixed pool of threads and an /api/events stream holds
+    one for as long as the page is open, so the streams are capped below
+    `threads` (see EVENT_STREAMS).
+    """
+    container_feed.max_subscribers = min(EVENT_STREAMS or threads // 2, threads - 1) if threads > 1 else 0
+    try:
+        from waitress import serve
+        print(f"Serving with waitress on {host}:{port} ({threads} threads).", file=sys.stderr)
+        serve(app, host=host, port=port, threads=threads)
+        return
+    except ImportError:
+        pass
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("Neither waitress nor gunicorn is installed, using the threaded Werkzeug server.", file=sys.stderr)
+        app.run(host=host, port=port, threaded=True)
+        return
+
+    class ScannerApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", threads)
+            # SSE streams stay open, they must not be killed as stuck requests
+            self.cfg.set("timeout", 0)
+
+        def load(self):
+            return app
+
+    print(f"Serving with gunicorn on {host}:{port} ({workers} workers x {threads} threads).", file=sys.stderr)
+    ScannerApplication().run()
+
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    parser = argparse.ArgumentParser(description="Docker container scanner.")
+    parser.add_argument('--production', action='store_true', help='Serve with waitress or gunicorn instead of the debug server.')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='gunicorn workers')
+    args = parser.parse_args()
+
+    if args.production:
+        serve_production(args.host, args.port, args.threads, args.workers)
+    else:
+        app.run(debug=True, host=args.host, port=args.port)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Times 'docker_inventory.py --list' and '--host' against a stub daemon with 10, 100 and 1000 containers.
+
+    python3 bench_inventory.py [--runs 5] [--sizes 10 100 1000]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_docker import start_stub
+
+INVENTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docker_inventory.py")
+
+
+def time_inventory(socket_path, runs, args=("--list",)):
+    """
+    Runs the inventory script `runs` times.
+
+    Returns:
+        tuple: (process, build) durations in milliseconds; process includes the
+               interpreter start-up, build is what the script reports with --timing.
+    """
+    # Without the inventory cache, every run talks to the daemon
+    env = dict(os.environ, DOCKER_HOST=f"unix://{socket_path}", DOCKER_INVENTORY_CACHE_TTL="0")
+    process, build = [], []
+    for _ in range(runs):
+        started = time.monotonic()
+        result = subprocess.run([sys.executable, INVENTORY] + list(args) + ["--timing"], env=env, check=True,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        process.append((time.monotonic() - started) * 1000)
+        build.append(float(re.search(r'built in ([0-9.]+) ms', result.stderr).group(1)))
+    return process, build
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Docker dynamic inventory.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'containers':>10}{'process p50(ms)':>17}{'build p50(ms)':>15}{'build max(ms)':>15}{'--host p50(ms)':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            socket_path = os.path.join(tmp, f"docker-{size}.sock")
+            server = start_stub(socket_path, size)
+            try:
+                process, build = time_inventory(socket_path, args.runs)
+                _, host = time_inventory(socket_path, args.runs, ("--host", f"systemd-{size}"))
+            finally:
+                server.shutdown()
+            print(f"{size:>10}{statistics.median(process):>17.1f}{statistics.median(build):>15.1f}{max(build):>15.1f}"
+                  f"{statistics.median(host):>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
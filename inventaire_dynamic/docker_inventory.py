@@ -1,25 +1,130 @@
 #!/usr/bin/env python3
 
+import http.client
 import json
+import os
+import socket
 import subprocess
 import sys
+import time
+
+from inventory_cache import InventoryCache
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+API_TIMEOUT = 10
+GROUP = "docker_containers_ssh"
+# Events after which a container appears in or disappears from 'docker ps'
+# ('kill' may only send a signal, and paused containers are still listed;
+# a container that really stops also sends 'die')
+START_EVENTS = ("start",)
+STOP_EVENTS = ("die", "stop", "destroy")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection to the Docker Engine API over its Unix socket.
+    """
+
+    def __init__(self, socket_path, timeout=API_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def docker_socket_path():
+    """
+    Returns the Unix socket of the Docker daemon, None if DOCKER_HOST points to something else.
+    """
+    docker_host = os.environ.get("DOCKER_HOST", f"unix://{DOCKER_SOCKET}")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    return None
+
+
+def docker_api_get(path, socket_path):
+    """
+    Sends a GET request to the Docker Engine API and returns the decoded JSON answer.
+    """
+    connection = UnixHTTPConnection(socket_path)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"GET {path} returned {response.status}: {body.decode(errors='replace')}")
+        return json.loads(body)
+    finally:
+        connection.close()
 
 
 def get_docker_containers():
     """
-    Retrieves the list of all active Docker containers.
+    Retrieves the list of all active Docker containers with their IP address.
+
+    A single GET /containers/json on the Docker socket returns the names and
+    the networks of every container. Without access to the socket, one
+    'docker ps' and one multi-ID 'docker inspect' are used instead.
+    """
+    socket_path = docker_socket_path()
+    if socket_path and os.path.exists(socket_path):
+        try:
+            return [
+                {
+                    "ID": container["Id"],
+                    "Names": container["Names"][0].lstrip("/"),
+                    "IPAddress": first_ip_address(container.get("NetworkSettings")),
+                }
+                for container in docker_api_get("/containers/json", socket_path)
+            ]
+        except (OSError, RuntimeError, ValueError) as e:
+            print(f"Warning: Docker API unavailable ({e}), falling back to the docker CLI.", file=sys.stderr)
+    return get_docker_containers_cli()
+
+
+def get_docker_containers_cli():
+    """
+    Same as get_docker_containers() with two docker commands, whatever the number of containers.
     """
     try:
         output = subprocess.check_output(
             ["docker", "ps", "--format", "json"],
             universal_newlines=True
         )
-        return [json.loads(line) for line in output.strip().split('\n')]
+        containers = [json.loads(line) for line in output.strip().split('\n') if line]
+        if not containers:
+            return []
+
+        # One inspect for every container instead of one per container
+        output = subprocess.check_output(
+            ["docker", "inspect"] + [container["ID"] for container in containers],
+            universal_newlines=True
+        )
+        # 'docker ps' gives the short (12 characters) ID, 'docker inspect' the full one
+        ip_addresses = {
+            details["Id"][:12]: first_ip_address(details.get("NetworkSettings")) for details in json.loads(output)
+        }
+        for container in containers:
+            container["IPAddress"] = ip_addresses.get(container["ID"][:12], "")
+        return containers
     except (subprocess.CalledProcessError, FileNotFoundError) as e:
         print(f"Error: Unable to run Docker. Is the daemon active? {e}", file=sys.stderr)
         return []
 
 
+def first_ip_address(network_settings):
+    """
+    Returns the first non empty IP address of the container networks.
+    """
+    for network in ((network_settings or {}).get("Networks") or {}).values():
+        if network.get("IPAddress"):
+            return network["IPAddress"]
+    return ""
+
+
 def format_for_ansible(containers):
     """
     Formats the list of containers into a JSON inventory for Ansible.
@@ -29,7 +134,7 @@ def format_for_ansible(containers):
         "_meta": {
             "hostvars": {}
         },
-        "docker_containers_ssh": {
+        GROUP: {
             "hosts": [],
             "vars": {
                 # Configure Ansible to use SSH for these hosts
@@ -43,28 +148,130 @@ def format_for_ansible(containers):
 
     for container in containers:
         host_name = container["Names"]
-        inventory["docker_containers_ssh"]["hosts"].append(host_name)
+        inventory[GROUP]["hosts"].append(host_name)
+        inventory["_meta"]["hostvars"][host_name] = host_vars(container)
 
-        # Get the container's IP address for the SSH connection
-        ip_address = subprocess.check_output(
-            ["docker", "inspect", "-f", "{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}", container["ID"]],
-            universal_newlines=True
-        ).strip()
+    return inventory
 
-        # Set the IP address as the connection host
-        inventory["_meta"]["hostvars"][host_name] = {
-            "ansible_host": ip_address
-        }
 
+def host_vars(container):
+    """
+    Returns the variables of one container host.
+    """
+    # Set the IP address as the connection host
+    return {
+        "ansible_host": container["IPAddress"]
+    }
+
+
+def get_inventory(refresh=False):
+    """
+    Returns the inventory from the cache, or builds it (and caches it) when
+    the cache is missing, expired or refresh is True.
+    """
+    cache = InventoryCache("docker_inventory", os.environ.get("DOCKER_HOST", ""))
+    inventory = None if refresh else cache.load()
+    if inventory is None:
+        inventory = format_for_ansible(get_docker_containers())
+        # An empty inventory may only mean the daemon was unreachable, do not keep it
+        if inventory["_meta"]["hostvars"]:
+            cache.save(inventory)
     return inventory
 
 
+def get_host(host):
+    """
+    Returns the variables of one host: from the cache when it is fresh, else
+    from a single inspect of that container (never a listing of the daemon).
+    """
+    cached = InventoryCache("docker_inventory", os.environ.get("DOCKER_HOST", "")).host_vars(host)
+    if cached is not None:
+        return cached
+    container = get_container(host)
+    return host_vars(container) if container else {}
+
+
+def docker_events():
+    """
+    Yields the container events of the daemon, as decoded JSON objects, forever.
+    """
+    socket_path = docker_socket_path()
+    if socket_path and os.path.exists(socket_path):
+        connection = UnixHTTPConnection(socket_path, timeout=None)
+        connection.request("GET", '/events?filters={"type":["container"]}')
+        response = connection.getresponse()
+        stream = response
+    else:
+        process = subprocess.Popen(
+            ["docker", "events", "--format", "{{json .}}", "--filter", "type=container"],
+            stdout=subprocess.PIPE, universal_newlines=True
+        )
+        stream = process.stdout
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def watch():
+    """
+    Keeps the inventory cache up to date from the Docker events.
+
+    Only the host affected by an event is patched: started containers are
+    inspected and added, stopped ones removed. While this runs, --list is
+    always served from the cache.
+    """
+    cache = InventoryCache("docker_inventory", os.environ.get("DOCKER_HOST", ""))
+    cache.save(format_for_ansible(get_docker_containers()))
+    cache.register_watcher()
+    try:
+        for event in docker_events():
+            action = event.get("Action", event.get("status", ""))
+            name = event.get("Actor", {}).get("Attributes", {}).get("name")
+            if action in START_EVENTS:
+                container = get_container(event.get("id") or event["Actor"]["ID"])
+                if container:
+                    cache.patch_host(container["Names"], host_vars(container), [GROUP])
+            elif action in STOP_EVENTS and name:
+                cache.remove_host(name)
+            elif action == "rename":
+                cache.save(format_for_ansible(get_docker_containers()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cache.unregister_watcher()
+
+
+def get_container(container_id):
+    """
+    Inspects a single container, returns it in the format of get_docker_containers().
+    """
+    socket_path = docker_socket_path()
+    try:
+        if socket_path and os.path.exists(socket_path):
+            details = docker_api_get(f"/containers/{container_id}/json", socket_path)
+        else:
+            details = json.loads(subprocess.check_output(["docker", "inspect", container_id],
+                                                         universal_newlines=True))[0]
+    except (OSError, RuntimeError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Warning: Unable to inspect container {container_id}: {e}", file=sys.stderr)
+        return None
+    return {
+        "ID": details["Id"],
+        "Names": details["Name"].lstrip("/"),
+        "IPAddress": first_ip_address(details.get("NetworkSettings")),
+    }
+
+
 if __name__ == "__main__":
+    started = time.monotonic()
     if len(sys.argv) > 1 and sys.argv[1] == '--list':
-        containers = get_docker_containers()
-        ansible_inventory = format_for_ansible(containers)
+        ansible_inventory = get_inventory(refresh='--refresh-cache' in sys.argv)
         print(json.dumps(ansible_inventory, indent=2))
-    elif len(sys.argv) > 1 and sys.argv[1] == '--host':
-        print(json.dumps({}))
+    elif len(sys.argv) > 2 and sys.argv[1] == '--host':
+        print(json.dumps(get_host(sys.argv[2]), indent=2))
+    elif len(sys.argv) > 1 and sys.argv[1] == '--watch':
+        watch()
     else:
-        print("Usage: ./docker_inventory.py --list", file=sys.stderr)
\ No newline at end of file
+        print("Usage: ./docker_inventory.py --list [--refresh-cache] [--timing] | --host NAME | --watch", file=sys.stderr)
+    if '--timing' in sys.argv:
+        print(f"Inventory built in {(time.monotonic() - started) * 1000:.1f} ms", file=sys.stderr)
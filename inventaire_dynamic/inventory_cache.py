@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of a dynamic inventory.
+
+Ansible (and AWX, once per job) can call an inventory script several times per
+run; the first --list saves the inventory and the next ones are served from
+the cache until it is older than the TTL. A watcher process following
+'docker events' can keep the cache up to date host by host: while it runs, the
+cache never expires.
+
+Used by docker_inventory.py and by dynamic-inventory/get_containers.py, where
+this file is a symbolic link so that both inventory directories stay self-contained.
+
+Settings come from the environment:
+    DOCKER_INVENTORY_CACHE_DIR   cache directory (default: ~/.cache/docker_inventory)
+    DOCKER_INVENTORY_CACHE_TTL   TTL in seconds (default: 60, 0 disables the cache)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+CACHE_DIR = os.environ.get("DOCKER_INVENTORY_CACHE_DIR", os.path.expanduser("~/.cache/docker_inventory"))
+CACHE_TTL = int(os.environ.get("DOCKER_INVENTORY_CACHE_TTL", "60"))
+
+
+class InventoryCache:
+    """
+    Cache of one inventory script for one Docker daemon.
+
+    Args:
+        name (str): name of the inventory script.
+        daemon (str): the daemon the inventory comes from, part of the cache key.
+    """
+
+    def __init__(self, name, daemon="", ttl=CACHE_TTL, directory=CACHE_DIR):
+        key = hashlib.sha1(daemon.encode()).hexdigest()[:12]
+        self.ttl = ttl
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}-{key}.json")
+        self.watcher_path = self.path + ".watcher"
+
+    def load(self):
+        """
+        Returns the cached inventory, None if there is none, if it has expired
+        or if it was saved stale.
+        """
+        if self.ttl <= 0:
+            return None
+        cached = self._load_payload()
+        if cached is None or cached.get("stale"):
+            return None
+        if not self.watcher_alive() and time.time() - cached.get("updated_at", 0) > self.ttl:
+            return None
+        return cached.get("inventory")
+
+    def host_vars(self, host):
+        """
+        Returns the variables of one host from the cached inventory, None if
+        the cache has expired or does not know the host.
+        """
+        inventory = self.load()
+        if inventory is None:
+            return None
+        return inventory.get("_meta", {}).get("hostvars", {}).get(host)
+
+    def save(self, inventory, stale=False):
+        """
+        Writes the inventory through a temporary file, readers never see a partial file.
+
+        A stale inventory (some daemon did not answer) is kept for the patches
+        of a watcher, but load() does not serve it.
+        """
+        if self.ttl <= 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".inventory.")
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"updated_at": time.time(), "inventory": inventory, "stale": stale}, f)
+        os.replace(temp_path, self.path)
+
+    def invalidate(self):
+        """Drops the cached inventory, the next --list rebuilds it."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def patch_host(self, host, hostvars, groups):
+        """
+        Adds or updates one host of the cached inventory.
+
+        Args:
+            host (str): inventory hostname.
+            hostvars (dict): its variables.
+            groups (list): the groups it belongs to.
+        """
+        cached = self._load_payload()
+        if cached is None or cached.get("inventory") is None:
+            return
+        inventory = cached["inventory"]
+        self._drop_host(inventory, host)
+        inventory.setdefault("_meta", {}).setdefault("hostvars", {})[host] = hostvars
+        for group in groups:
+            inventory.setdefault(group, {}).setdefault("hosts", []).append(host)
+        self.save(inventory, cached.get("stale", False))
+
+    def remove_host(self, host):
+        """Removes one host from the cached inventory."""
+        cached = self._load_payload()
+        if cached is None or cached.get("inventory") is None:
+            return
+        self._drop_host(cached["inventory"], host)
+        self.save(cached["inventory"], cached.get("stale", False))
+
+    def watcher_alive(self):
+        """Tells whether a watcher process is keeping this cache up to date."""
+        try:
+            with open(self.watcher_path, 'r') as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def register_watcher(self):
+        """Records the current process as the watcher of the cache."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.watcher_path, 'w') as f:
+            f.write(str(os.getpid()))
+
+    def unregister_watcher(self):
+        try:
+            os.remove(self.watcher_path)
+        except FileNotFoundError:
+            pass
+
+    def _load_payload(self):
+        # Patches are applied whatever the age of the cache.
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _drop_host(inventory, host):
+        inventory.get("_meta", {}).get("hostvars", {}).pop(host, None)
+        for group, content in inventory.items():
+            if group != "_meta" and isinstance(content, dict) and host in content.get("hosts", []):
+                content["hosts"].remove(host)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Load test of the scanner: p50/p99 latency of /api/scan at increasing concurrency.
+
+The app runs in a subprocess against a stub Docker daemon (stub_docker.py):
+
+    python3 loadtest_scanner.py [--containers 500] [--concurrency 1 4 16 64] [--requests 200]
+    python3 loadtest_scanner.py --debug-server      # the same against 'app.py' without --production
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_docker import start_stub
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The scanner did not listen on port {port} within {timeout}s.")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run_level(port, path, concurrency, requests):
+    """
+    Sends `requests` GETs with `concurrency` keep-alive clients.
+
+    Returns:
+        tuple: (latencies in milliseconds, errors, elapsed seconds)
+    """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_client = max(1, requests // concurrency)
+
+    def client():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        for _ in range(per_client):
+            started = time.monotonic()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                ok = False
+            with lock:
+                (latencies if ok else errors).append((time.monotonic() - started) * 1000)
+        connection.close()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return latencies, errors, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the container scanner.")
+    parser.add_argument('--containers', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+    parser.add_argument('--path', default='/api/scan')
+    parser.add_argument('--scan-ttl', default='2', help='SCANNER_SCAN_TTL of the app (0: every request scans)')
+    parser.add_argument('--debug-server', action='store_true', help='run the app without --production')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, "docker.sock")
+        stub = start_stub(socket_path, args.containers)
+        port = free_port()
+        env = dict(os.environ, DOCKER_HOST=f"unix://{socket_path}", SCANNER_SCAN_TTL=args.scan_ttl)
+        command = [sys.executable, APP, "--host", "127.0.0.1", "--port", str(port)]
+        if not args.debug_server:
+            command.append("--production")
+        app = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            # The first request connects to the daemon, it is not measured
+            run_level(port, args.path, 1, 1)
+            print(f"{args.path}, {args.containers} containers, "
+                  f"{'debug server' if args.debug_server else 'production server'}, scan TTL {args.scan_ttl}s")
+            print(f"{'concurrency':>11}{'p50(ms)':>10}{'p99(ms)':>10}{'req/s':>9}{'errors':>8}")
+            for concurrency in args.concurrency:
+                latencies, errors, elapsed = run_level(port, args.path, concurrency, args.requests)
+                if latencies:
+                    print(f"{concurrency:>11}{statistics.median(latencies):>10.1f}{percentile(latencies, 0.99):>10.1f}"
+                          f"{len(latencies) / elapsed:>9.0f}{len(errors):>8}")
+                else:
+                    print(f"{concurrency:>11}{'-':>10}{'-':>10}{'-':>9}{len(errors):>8}")
+        finally:
+            app.terminate()
+            app.wait()
+            stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
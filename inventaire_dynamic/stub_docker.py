@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Stand-in Docker daemon for benchmarks.
+
+Serves a small subset of the Docker Engine API on a Unix socket, with a
+configurable number of fake containers, so that the inventory scripts and the
+scanner can be timed without a real daemon:
+
+    python3 stub_docker.py /tmp/docker.sock --containers 1000
+    DOCKER_HOST=unix:///tmp/docker.sock ./docker_inventory.py --list --timing
+"""
+import argparse
+import json
+import os
+import queue
+import re
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+
+# The only image of the stub, the one of every fake container
+IMAGE = {"Id": "sha256:" + "a" * 64, "RepoTags": ["docker-systemd:almalinux-10"]}
+
+
+def fake_container(i):
+    """Returns the /containers/json entry of the i-th fake container."""
+    return {
+        "Id": f"{i:012x}" + "0" * 52,
+        "Names": [f"/systemd-{i}"],
+        "Image": "docker-systemd:almalinux-10",
+        "ImageID": IMAGE["Id"],
+        "State": "running",
+        "Status": "Up 5 minutes",
+        "Labels": {"lab.managed": "true", "lab.pool": "almalinux", "ansible.group": "lab,almalinux"},
+        "Ports": [{"PrivatePort": 22, "PublicPort": 32000 + i, "Type": "tcp", "IP": "0.0.0.0"}],
+        "NetworkSettings": {
+            "Networks": {"bridge": {"IPAddress": f"172.17.{i // 250}.{i % 250 + 2}"}}
+        },
+    }
+
+
+class StubDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def filtered_containers(self):
+        """Applies the 'id' (prefix) and 'name' (substring) filters of the query string."""
+        query = parse_qs(urlparse(self.path).query)
+        filters = json.loads(query.get("filters", ["{}"])[0])
+        containers = self.server.containers
+        for key in filters.get("id", []):
+            containers = [container for container in containers if container["Id"].startswith(key)]
+        for name in filters.get("name", []):
+            containers = [container for container in containers if name in container["Names"][0]]
+        return containers
+
+    def stream_events(self):
+        """Streams the events given to StubDockerServer.emit(), one JSON object per chunk."""
+        events = queue.Queue()
+        self.server.event_streams.append(events)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            while True:
+                body = (json.dumps(events.get()) + "\n").encode()
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.event_streams.remove(events)
+
+    def stream_stats(self, stream=True):
+        """Sends one 'docker stats' payload, or one per second while the client reads them."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        total = 0
+        try:
+            while True:
+                previous, total = total, total + 10_000_000
+                body = (json.dumps({
+                    "cpu_stats": {"cpu_usage": {"total_usage": total}, "system_cpu_usage": total * 20, "online_cpus": 2},
+                    "precpu_stats": {"cpu_usage": {"total_usage": previous}, "system_cpu_usage": previous * 20},
+                    "memory_stats": {"usage": 64 << 20, "limit": 2 << 30},
+                    "networks": {"eth0": {"rx_bytes": total // 1000, "tx_bytes": total // 2000}},
+                    "blkio_stats": {"io_service_bytes_recursive": [{"op": "read", "value": 4096}, {"op": "write", "value": 8192}]},
+                }) + "\n").encode()
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+                if not stream:
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                time.sleep(1)
+        except OSError:
+            pass
+
+    def do_GET(self):
+        # Versioned paths (/v1.41/containers/json) are served like unversioned ones.
+        path = re.sub(r'^/v[0-9.]+', '', self.path.split("?")[0])
+        containers = self.server.containers
+        # A slow daemon, for the timeouts of the federated inventory
+        time.sleep(self.server.delay)
+        if path == "/_ping":
+            body = b"OK"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/version":
+            self.send_json({"Version": "24.0.0-stub", "ApiVersion": "1.43", "MinAPIVersion": "1.12"})
+        elif path == "/containers/json":
+            self.send_json(self.filtered_containers())
+        elif re.match(r'^/containers/[^/]+/stats$', path):
+            self.stream_stats("stream=false" not in self.path and "stream=0" not in self.path)
+        elif path == "/events":
+            self.stream_events()
+        elif path == "/images/json":
+            self.send_json([IMAGE])
+        elif re.match(r'^/images/.+/json$', path):
+            if path.split("/")[2] in (IMAGE["Id"], IMAGE["Id"][len("sha256:"):], IMAGE["RepoTags"][0]):
+                self.send_json(IMAGE)
+            else:
+                self.send_json({"message": f"No such image: {path.split('/')[2]}"}, 404)
+        elif re.match(r'^/containers/[^/]+/json$', path):
+            key = path.split("/")[2]
+            for container in containers:
+                if container["Id"].startswith(key) or container["Names"][0] == "/" + key:
+                    self.send_json(dict(container, Name=container["Names"][0],
+                                        Config={"Image": container["Image"], "Labels": container["Labels"]}))
+                    return
+            self.send_json({"message": f"No such container: {key}"}, 404)
+        else:
+            self.send_json({"message": "page not found"}, 404)
+
+
+class StubDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, containers=10, delay=0):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, StubDockerHandler)
+        self.containers = [fake_container(i) for i in range(1, containers + 1)]
+        self.delay = delay
+        self.event_streams = []
+
+    def emit(self, action, container):
+        """Sends a container event to every open /events stream."""
+        event = {
+            "Type": "container", "Action": action, "id": container["Id"],
+            "Actor": {"ID": container["Id"], "Attributes": {"name": container["Names"][0].lstrip("/")}},
+        }
+        for events in list(self.event_streams):
+            events.put(event)
+
+
+def start_stub(socket_path, containers=10, delay=0):
+    """Starts a stub daemon in a background thread and returns the server (call shutdown() to stop it)."""
+    server = StubDockerServer(socket_path, containers, delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Docker daemon on a Unix socket.")
+    parser.add_argument('socket_path')
+    parser.add_argument('--containers', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=0, help='seconds to wait before each answer')
+    args = parser.parse_args()
+    StubDockerServer(args.socket_path, args.containers, args.delay).serve_forever()
@@ -1,104 +1,160 @@
 #!/usr/bin/env python3
+import argparse
 import subprocess
 import sys
 import os
-import tempfile
-import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hosts_manager import HOSTS_FILE, HostsFile
 
 # --- Configuration ---
-# These should match the values in your creation script.
-NUM_CONTAINERS = 6
-BASE_NAME_TEMPLATE = "systemd-{}"
-HOSTNAME_TEMPLATE = "{}.home"
-HOSTS_FILE = "/etc/hosts"
-HOSTS_ENTRY_TAG = "# Entry added by Docker script"
+# The containers are found with the label set by pool_engine.py, or by name with --name-pattern.
+MANAGED_LABEL = "lab.managed=true"
+DEFAULT_WORKERS = 8
+DEFAULT_STOP_TIMEOUT = 2
+RM_BATCH_SIZE = 200
 
 
-def run_command(command, check=True):
+def run_command(command, check=True, capture_output=False):
     """
     Executes a shell command and handles errors.
 
     Args:
         command (list): The command to execute as a list of strings.
         check (bool): If True, raises an exception on non-zero exit codes.
+        capture_output (bool): If True, captures and returns stdout.
+
+    Returns:
+        tuple: (success, output)
+               success (bool): True if the command succeeded, False otherwise.
+               output (str or None): The stdout if capture_output is True, else None.
     """
     try:
-        print(f"Executing: {' '.join(command)}")
-        subprocess.run(
+        print(f"Executing: {' '.join(command)}", flush=True)
+        result = subprocess.run(
             command,
             check=check,
             capture_output=True,
             text=True,
             encoding='utf-8'
         )
-        return True
+        return result.returncode == 0, result.stdout.strip() if capture_output else None
     except FileNotFoundError:
         print(f"Error: Command '{command[0]}' not found. Is Docker installed and in your PATH?")
-        return False
+        return False, None
     except subprocess.CalledProcessError as e:
         # Don't print an error if the container just doesn't exist
         if not ("No such object" in e.stderr or "No such container" in e.stderr):
             print(f"Error executing command: {' '.join(command)}")
             print(f"Stderr: {e.stderr.strip()}")
-        return False
+        return False, e.stdout.strip() if capture_output else None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        return False
+        return False, None
 
 
-def remove_container(name):
+def discover_managed_containers(label=MANAGED_LABEL, name_pattern=None):
+    """
+    Finds the containers to tear down and their hostname.
+
+    One 'docker ps -a' selects the containers by label (or by name regex when
+    name_pattern is given), one multi-ID 'docker inspect' reads their hostname.
+
+    Returns:
+        dict: container name -> hostname
+    """
+    container_filter = f"name={name_pattern}" if name_pattern else f"label={label}"
+    success, output = run_command(
+        ["docker", "ps", "-a", "--no-trunc", "--filter", container_filter, "--format", "{{.ID}}"],
+        capture_output=True
+    )
+    ids = output.split() if success and output else []
+    return get_hostnames(ids)
+
+
+def get_hostnames(ids):
+    """
+    Reads the hostname of the given containers, one 'docker inspect' per RM_BATCH_SIZE ids or names.
+
+    Returns:
+        dict: container name -> hostname
+    """
+    containers = {}
+    for offset in range(0, len(ids), RM_BATCH_SIZE):
+        success, output = run_command(
+            ["docker", "inspect", "-f", "{{.Name}}\t{{.Config.Hostname}}"] + ids[offset:offset + RM_BATCH_SIZE],
+            check=False, capture_output=True
+        )
+        for line in (output or "").splitlines():
+            name, _, hostname = line.partition("\t")
+            containers[name.lstrip("/")] = hostname
+    return containers
+
+
+def remove_container(name, stop_timeout=DEFAULT_STOP_TIMEOUT):
     """Stops and removes a Docker container if it exists."""
-    print(f"Attempting to stop and remove container '{name}'...")
+    print(f"Attempting to stop and remove container '{name}'...", flush=True)
     # The 'docker stop' command will fail if the container is already stopped,
     # but that's okay. 'docker rm' will then remove it.
-    run_command(["docker", "stop", name], check=False)
-    run_command(["docker", "rm", name], check=False)
-    print(f"Finished removal attempt for container '{name}'.")
+    run_command(["docker", "stop", "-t", str(stop_timeout), name], check=False)
+    success, _ = run_command(["docker", "rm", name], check=False)
+    print(f"Finished removal attempt for container '{name}'.", flush=True)
+    return success
 
 
-def clean_hosts_file(hostname):
-    """Removes an entry from the /etc/hosts file safely."""
-    print(f"Attempting to remove entry for '{hostname}' from {HOSTS_FILE}.")
+def remove_containers_bulk(names):
+    """
+    Kills and removes the containers with one 'docker rm -f' per RM_BATCH_SIZE names.
+
+    Returns:
+        list: the names of the containers that could not be removed.
+    """
+    failed = []
+    for offset in range(0, len(names), RM_BATCH_SIZE):
+        batch = names[offset:offset + RM_BATCH_SIZE]
+        success, _ = run_command(["docker", "rm", "-f"] + batch, check=False)
+        if not success:
+            # 'docker rm -f' goes on after an error: look for the containers that are still there
+            remaining = get_hostnames(batch)
+            failed += [name for name in batch if name in remaining]
+    report_failed_removals(failed)
+    return failed
+
+
+def remove_containers_parallel(names, workers=DEFAULT_WORKERS, stop_timeout=DEFAULT_STOP_TIMEOUT):
+    """
+    Stops (with a grace period of stop_timeout seconds) and removes the containers from a worker pool.
+
+    Returns:
+        list: the names of the containers that could not be removed.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        removed = list(executor.map(lambda name: remove_container(name, stop_timeout), names))
+    failed = [name for name, success in zip(names, removed) if not success]
+    report_failed_removals(failed)
+    return failed
+
+
+def report_failed_removals(failed):
+    """Prints the containers that are still there after a removal."""
+    if failed:
+        print(f"Error: {len(failed)} containers could not be removed: {', '.join(failed)}", file=sys.stderr)
+
+
+def clean_hosts_file(hostnames):
+    """Removes the entries of the given hostnames from /etc/hosts in a single write."""
+    print(f"Attempting to remove {len(hostnames)} entries from {HOSTS_FILE}.")
     try:
-        # Create a temporary file to write the new hosts content
-        fd, temp_path = tempfile.mkstemp()
-
-        lines_removed = False
-        with os.fdopen(fd, 'w') as new_file:
-            with open(HOSTS_FILE, 'r') as old_file:
-                for line in old_file:
-                    # If the line contains the hostname, we skip it (don't write to new file)
-                    if hostname in line.split() and HOSTS_ENTRY_TAG not in line:
-                        # This logic handles cases where the hostname might exist for other reasons.
-                        # We only want to remove lines added by our script.
-                        # A safer approach is to look for the hostname and the comment tag.
-                        pass
-
-                    # A better way is to remove the line with the hostname AND the comment above it
-                    if hostname not in line:
-                        new_file.write(line)
-                    else:
-                        lines_removed = True
-
-        if lines_removed:
-            # Preserve original file's permissions and ownership
-            shutil.copymode(HOSTS_FILE, temp_path)
-            shutil.chown(temp_path, os.stat(HOSTS_FILE).st_uid, os.stat(HOSTS_FILE).st_gid)
-            # Replace the original file with the temporary file
-            shutil.move(temp_path, HOSTS_FILE)
-            print(f"Successfully removed entry for '{hostname}' from {HOSTS_FILE}.")
+        if HostsFile(HOSTS_FILE).apply(remove=hostnames):
+            print(f"Successfully removed the entries from {HOSTS_FILE}.")
         else:
-            print(f"No entry for '{hostname}' found to remove.")
-            os.remove(temp_path)  # Clean up the temp file if we didn't use it
-
+            print("No entry found to remove.")
     except PermissionError:
         print(f"Error: Permission denied. You must run this script with sudo to modify {HOSTS_FILE}.")
         return False
     except Exception as e:
         print(f"Failed to modify {HOSTS_FILE}: {e}")
-        # Clean up temp file on error
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            os.remove(temp_path)
         return False
     return True
 
@@ -107,42 +163,48 @@ def main():
     """
     Main function to remove containers and clean up the hosts file.
     """
+    parser = argparse.ArgumentParser(description="Tear down the lab containers and their /etc/hosts entries.")
+    parser.add_argument('--label', default=MANAGED_LABEL,
+                        help=f'Select the containers by label (default: {MANAGED_LABEL}).')
+    parser.add_argument('--name-pattern',
+                        help="Select the containers by name regex instead, e.g. '^systemd-[0-9]+$'.")
+    parser.add_argument('--mode', choices=['bulk', 'parallel'], default='bulk',
+                        help="'bulk' kills them with batched 'docker rm -f' (default), "
+                             "'parallel' stops them gracefully from a worker pool.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of workers in parallel mode (default: {DEFAULT_WORKERS}).')
+    parser.add_argument('--stop-timeout', type=int, default=DEFAULT_STOP_TIMEOUT,
+                        help=f'Seconds given to each container to stop in parallel mode '
+                             f'(default: {DEFAULT_STOP_TIMEOUT}).')
+    args = parser.parse_args()
+
     # Check for root/sudo privileges
     if os.geteuid() != 0:
         print("This script needs to modify /etc/hosts and remove Docker containers.")
         print("Please run it with sudo: sudo python3 your_cleanup_script.py")
         sys.exit(1)
 
-    print(f"Starting cleanup script for {NUM_CONTAINERS} containers...")
-
-    for i in range(1, NUM_CONTAINERS + 1):
-        container_name = BASE_NAME_TEMPLATE.format(i)
-        hostname = HOSTNAME_TEMPLATE.format(i)
-        print(f"\n--- Cleaning up resource #{i}: {container_name} ---")
-
-        # 1. Remove the container
-        remove_container(container_name)
-
-        # 2. Clean the /etc/hosts file
-        # This part is tricky because we don't know the IP.
-        # We will search for the hostname instead.
-        clean_hosts_file(hostname)
-
-    print("\n--- Attempting to remove the script's comment header from /etc/hosts ---")
-    try:
-        with open(HOSTS_FILE, "r") as f:
-            lines = f.readlines()
-        with open(HOSTS_FILE, "w") as f:
-            for line in lines:
-                if HOSTS_ENTRY_TAG not in line.strip("\n"):
-                    f.write(line)
-        print("General cleanup of host file comments complete.")
-    except Exception as e:
-        print(f"Could not perform final cleanup of host file comments: {e}")
-
-    print(f"\n--- Script finished. ---")
-    print("Running 'docker ps -a -q --filter name=systemd-*' to check for remaining containers:")
-    run_command(["docker", "ps", "-a", "-q", "--filter", "name=systemd-*"])
+    started = time.monotonic()
+    containers = discover_managed_containers(args.label, args.name_pattern)
+    print(f"Starting cleanup script for {len(containers)} containers...")
+
+    names = sorted(containers)
+    if args.mode == 'bulk':
+        failed = remove_containers_bulk(names)
+    else:
+        failed = remove_containers_parallel(names, args.workers, args.stop_timeout)
+
+    # The /etc/hosts entries are matched on the hostname, we don't know the IP.
+    # The entries of the containers that are still there are kept.
+    print(f"\n--- Cleaning up {HOSTS_FILE} ---")
+    clean_hosts_file([hostname for name, hostname in containers.items() if hostname and name not in failed])
+
+    print(f"\n--- Script finished in {time.monotonic() - started:.2f}s. ---")
+    print("Running 'docker ps -a -q' to check for remaining containers:")
+    container_filter = f"name={args.name_pattern}" if args.name_pattern else f"label={args.label}"
+    run_command(["docker", "ps", "-a", "-q", "--filter", container_filter])
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Manager of the container entries in /etc/hosts.
+
+All the entries written by the setup scripts live in one delimited block:
+
+    # BEGIN docker containers (managed by setup scripts)
+    172.17.0.2	1.home
+    # END docker containers
+
+A create or a teardown computes the new content of the block and writes the
+whole file once, atomically. Hostnames are compared as whole tokens, so
+'1.home' never matches '10.home'. Entries left by older versions of the
+scripts ('# Entry added by Docker script' followed by one entry) are moved
+into the block the first time the file is rewritten.
+"""
+import errno
+import os
+import re
+import tempfile
+
+# --- Configuration ---
+HOSTS_FILE = "/etc/hosts"
+BEGIN_MARKER = "# BEGIN docker containers (managed by setup scripts)"
+END_MARKER = "# END docker containers"
+LEGACY_TAG = "# Entry added by Docker script"
+
+
+def _natural_key(hostname):
+    """Sorts '2.home' before '10.home'."""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', hostname)]
+
+
+class HostsFile:
+    """
+    Reads and rewrites the managed block of a hosts file.
+
+    Args:
+        path (str): the hosts file, /etc/hosts by default.
+    """
+
+    def __init__(self, path=HOSTS_FILE):
+        self.path = path
+
+    def parse(self, content):
+        """
+        Splits the file content into the unmanaged lines and the managed entries.
+
+        Returns:
+            tuple: (lines, entries, block_index)
+                   lines (list): every line outside the managed block, legacy entries removed.
+                   entries (dict): hostname -> ip address of the managed (and legacy) entries.
+                   block_index (int or None): position of the block in `lines`.
+        """
+        lines = []
+        entries = {}
+        block_index = None
+        in_block = False
+        legacy_next = False
+        for line in content.splitlines():
+            stripped = line.strip()
+            if stripped == BEGIN_MARKER:
+                in_block = True
+                block_index = len(lines)
+                continue
+            if stripped == END_MARKER:
+                in_block = False
+                continue
+            if stripped == LEGACY_TAG:
+                # The legacy writer put a blank line before each tag.
+                if lines and not lines[-1].strip() and block_index != len(lines):
+                    lines.pop()
+                legacy_next = True
+                continue
+            if in_block or legacy_next:
+                legacy_next = False
+                fields = stripped.split()
+                if len(fields) >= 2 and not fields[0].startswith("#"):
+                    for hostname in fields[1:]:
+                        entries[hostname] = fields[0]
+                    continue
+                if in_block:
+                    continue
+            lines.append(line)
+        return lines, entries, block_index
+
+    def render(self, lines, entries, block_index):
+        """Builds the file content with the managed block at its previous place (or at the end)."""
+        block = []
+        if entries:
+            block = [BEGIN_MARKER]
+            block += [f"{entries[hostname]}\t{hostname}" for hostname in sorted(entries, key=_natural_key)]
+            block.append(END_MARKER)
+        if block_index is None:
+            block_index = len(lines)
+            if block and lines and lines[-1].strip():
+                block.insert(0, "")
+        new_lines = lines[:block_index] + block + lines[block_index:]
+        return "\n".join(new_lines) + "\n" if new_lines else ""
+
+    def read_entries(self):
+        """Returns the hostname -> ip address mapping currently managed."""
+        with open(self.path, 'r') as f:
+            return self.parse(f.read())[1]
+
+    def apply(self, upsert=None, remove=(), replace=False):
+        """
+        Updates the managed block in a single atomic write.
+
+        Args:
+            upsert (dict): hostname -> ip address to add or update.
+            remove (iterable): hostnames to drop.
+            replace (bool): if True, `upsert` becomes the whole content of the block.
+
+        Returns:
+            bool: True if the file has been rewritten, False if it was already up to date.
+        """
+        with open(self.path, 'r') as f:
+            content = f.read()
+        lines, entries, block_index = self.parse(content)
+        if replace:
+            entries = {}
+        entries.update(upsert or {})
+        for hostname in remove:
+            entries.pop(hostname, None)
+
+        new_content = self.render(lines, entries, block_index)
+        if new_content == content:
+            return False
+        self._write(new_content)
+        return True
+
+    def _write(self, content):
+        """Writes through a temporary file in the same directory, then renames it over the original."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        stat = os.stat(self.path)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".hosts.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(temp_path, stat.st_mode & 0o7777)
+            if os.geteuid() == 0:
+                os.chown(temp_path, stat.st_uid, stat.st_gid)
+            try:
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                # /etc/hosts is a bind mount inside containers and cannot be replaced.
+                if e.errno not in (errno.EBUSY, errno.EXDEV):
+                    raise
+                with open(self.path, 'w') as f:
+                    f.write(content)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
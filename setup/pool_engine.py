@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Shared provisioning engine for the systemd container pools.
+
+The generate_*.py scripts only describe a pool (image, count, name templates);
+this module creates the containers through a bounded worker pool, waits for
+their IP with an adaptive backoff instead of a fixed sleep, updates /etc/hosts,
+probes them until systemd and sshd are up (see readiness.py) and prints
+per-phase timings so large pools can be sized.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import readiness
+from hosts_manager import HOSTS_FILE, HostsFile
+
+# --- Configuration ---
+DEFAULT_CONCURRENCY = 8
+HOSTNAME_TEMPLATE = "{}.home"
+CREATE_RETRIES = 3
+IP_WAIT_TIMEOUT = 60
+BACKOFF_INITIAL = 0.2
+BACKOFF_MAX = 5.0
+INSPECT_BATCH_SIZE = 200
+# Every container gets these labels so that cleanup.py can find it back.
+MANAGED_LABEL = "lab.managed=true"
+POOL_LABEL = "lab.pool"
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    """Prints a message without interleaving output from worker threads."""
+    with _print_lock:
+        print(message, flush=True)
+
+
+def run_command(command, capture_output=False):
+    """
+    Executes a shell command and handles errors.
+
+    Args:
+        command (list): The command to execute as a list of strings.
+        capture_output (bool): If True, captures and returns stdout.
+
+    Returns:
+        tuple: (success, output)
+               success (bool): True if the command succeeded, False otherwise.
+               output (str or None): The stdout if capture_output is True, else None.
+    """
+    try:
+        log(f"Executing: {' '.join(command)}")
+        result = subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+            text=True,
+            encoding='utf-8'
+        )
+        return True, result.stdout.strip() if capture_output else None
+    except FileNotFoundError:
+        log(f"Error: Command '{command[0]}' not found. Is Docker installed and in your PATH?")
+        return False, None
+    except subprocess.CalledProcessError as e:
+        log(f"Error executing command: {' '.join(command)}\n"
+            f"Return Code: {e.returncode}\n"
+            f"Stdout: {e.stdout.strip()}\n"
+            f"Stderr: {e.stderr.strip()}")
+        return False, None
+    except Exception as e:
+        log(f"An unexpected error occurred: {e}")
+        return False, None
+
+
+class PhaseTimer:
+    """
+    Collects the duration of each phase (create, ip, hosts...) for every container.
+
+    The report gives, per phase, the number of samples, the wall-clock span
+    between the first start and the last end, and the average/max duration.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, phase, start, end):
+        with self._lock:
+            self._samples.setdefault(phase, []).append((start, end))
+
+    def phase(self, name):
+        return _PhaseContext(self, name)
+
+    def report(self):
+        log("\n--- Phase timings ---")
+        log(f"{'phase':<12}{'count':>7}{'wall(s)':>10}{'avg(s)':>10}{'max(s)':>10}")
+        with self._lock:
+            for phase, samples in self._samples.items():
+                durations = [end - start for start, end in samples]
+                wall = max(end for _, end in samples) - min(start for start, _ in samples)
+                log(f"{phase:<12}{len(durations):>7}{wall:>10.2f}"
+                    f"{sum(durations) / len(durations):>10.2f}{max(durations):>10.2f}")
+
+
+class _PhaseContext:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, self.start, time.monotonic())
+        return False
+
+
+class AdaptiveBackoff:
+    """
+    Delay shared by all workers, replacing the fixed time.sleep(5).
+
+    Each failure doubles the delay (up to BACKOFF_MAX) so that an overloaded
+    daemon gets some room; each success halves it back towards zero.
+    """
+
+    def __init__(self, initial=BACKOFF_INITIAL, maximum=BACKOFF_MAX):
+        self._lock = threading.Lock()
+        self.initial = initial
+        self.maximum = maximum
+        self.delay = 0.0
+
+    def failure(self):
+        with self._lock:
+            self.delay = min(self.maximum, max(self.initial, self.delay * 2))
+            return self.delay
+
+    def success(self):
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.initial else 0.0
+
+    def wait(self):
+        with self._lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+
+ContainerInfo = namedtuple("ContainerInfo", ["exists", "state", "ip", "pool"])
+MISSING = ContainerInfo(False, None, None, None)
+# What a container should look like: its hostname, image, pool and extra labels.
+ContainerSpec = namedtuple("ContainerSpec", ["hostname", "image", "pool", "labels"])
+IP_FORMAT = ('{{.Name}}\t{{.State.Status}}\t{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}'
+             '\t{{index .Config.Labels "' + POOL_LABEL + '"}}')
+
+
+def inspect_containers(ids):
+    """
+    Inspects several containers with one 'docker inspect' call per INSPECT_BATCH_SIZE ids.
+
+    Returns:
+        dict: container name -> ContainerInfo
+    """
+    index = {}
+    for offset in range(0, len(ids), INSPECT_BATCH_SIZE):
+        command = ["docker", "inspect", "-f", IP_FORMAT] + list(ids[offset:offset + INSPECT_BATCH_SIZE])
+        success, output = run_command(command, capture_output=True)
+        if not success:
+            continue
+        for line in output.splitlines():
+            name, state, ip_address, pool = (line.split("\t") + ["", "", ""])[:4]
+            pool = None if pool in ("", "<no value>") else pool
+            index[name.lstrip("/")] = ContainerInfo(True, state, ip_address or None, pool)
+    return index
+
+
+def discover_containers(names=None):
+    """
+    Builds a name -> ContainerInfo(exists, state, ip, pool) index of the containers.
+
+    One 'docker ps -a' lists the containers and their state, one multi-ID
+    'docker inspect' fetches the IP of the running ones, whatever the pool size.
+
+    Args:
+        names (iterable or None): only inspect these containers (default: all).
+    """
+    wanted = set(names) if names is not None else None
+    success, output = run_command(
+        ["docker", "ps", "-a", "--no-trunc", "--format",
+         '{{.ID}}\t{{.Names}}\t{{.State}}\t{{.Label "' + POOL_LABEL + '"}}'],
+        capture_output=True
+    )
+    if not success:
+        return {}
+
+    index = {}
+    running_ids = []
+    for line in output.splitlines():
+        container_id, name, state, pool = (line.split("\t") + ["", "", ""])[:4]
+        index[name] = ContainerInfo(True, state, None, pool or None)
+        if state == "running" and (wanted is None or name in wanted):
+            running_ids.append(container_id)
+    if running_ids:
+        index.update(inspect_containers(running_ids))
+    return index
+
+
+def pool_name(base_name_template):
+    """Default pool name of a name template: 'systemd-c{}' -> 'systemd-c'."""
+    return base_name_template.replace("{}", "").strip("-_.") or base_name_template
+
+
+def create_container(name, spec, backoff):
+    """Runs a privileged systemd container, retrying with backoff on failure."""
+    docker_run_command = [
+        "docker", "run", "-d",
+        "--name", name,
+        "--privileged",
+        "-v", "/sys/fs/cgroup:/sys/fs/cgroup:rw",
+        "--hostname", spec.hostname,
+        "--cgroupns=host",
+        "--label", MANAGED_LABEL,
+        "--label", f"{POOL_LABEL}={spec.pool}",
+    ]
+    for key, value in (spec.labels or {}).items():
+        docker_run_command += ["--label", f"{key}={value}"]
+    docker_run_command.append(spec.image)
+    for attempt in range(1, CREATE_RETRIES + 1):
+        backoff.wait()
+        success, _ = run_command(docker_run_command)
+        if success:
+            backoff.success()
+            return True
+        # A half-created container would make the next 'docker run' fail on the name.
+        run_command(["docker", "rm", "-f", name])
+        delay = backoff.failure()
+        log(f"Attempt {attempt}/{CREATE_RETRIES} to create '{name}' failed, backing off {delay:.1f}s.")
+    return False
+
+
+def wait_for_ips(names, timeout=IP_WAIT_TIMEOUT):
+    """
+    Polls the IP of all the given containers until they show up or timeout expires.
+
+    Every round is a single multi-ID 'docker inspect'; the delay between rounds
+    grows exponentially.
+
+    Returns:
+        dict: container name -> IP address (missing names never got one)
+    """
+    deadline = time.monotonic() + timeout
+    delay = BACKOFF_INITIAL
+    pending = list(names)
+    found = {}
+    while pending:
+        for name, info in inspect_containers(pending).items():
+            if info.ip:
+                found[name] = info.ip
+        pending = [name for name in pending if name not in found]
+        if not pending or time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(BACKOFF_MAX, delay * 2)
+    return found
+
+
+def update_hosts_file(entries, remove=()):
+    """
+    Writes the hostname -> ip address entries into the managed block of /etc/hosts.
+
+    Every entry (and every removal of `remove` hostnames) is applied in one
+    atomic write, whatever the pool size.
+    """
+    log(f"Updating {len(entries)} entries in {HOSTS_FILE}...")
+    try:
+        if HostsFile(HOSTS_FILE).apply(upsert=entries, remove=remove):
+            log(f"Successfully updated {HOSTS_FILE}.")
+        else:
+            log(f"{HOSTS_FILE} is already up to date. Skipping.")
+        return True
+    except PermissionError:
+        log(f"Error: Permission denied. You must run this script with sudo to modify {HOSTS_FILE}.")
+        return False
+    except Exception as e:
+        log(f"Failed to write to {HOSTS_FILE}: {e}")
+        return False
+
+
+def provision_container(name, spec, info, timer, backoff):
+    """
+    Makes sure one container exists and is running.
+
+    Args:
+        spec (ContainerSpec): how to create it.
+        info (ContainerInfo): what discover_containers() knows about it.
+
+    Returns:
+        bool: True if the container is (or has been) started.
+    """
+    with timer.phase("create"):
+        if info.state == "running":
+            log(f"Container '{name}' already exists. Skipping creation.")
+            return True
+        if info.exists:
+            log(f"Container '{name}' exists but is {info.state}. Starting it.")
+            success, _ = run_command(["docker", "start", name])
+            return success
+        if not create_container(name, spec, backoff):
+            log(f"Failed to create container '{name}'.")
+            return False
+    return True
+
+
+def provision_containers(specs, index, timer, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Creates the containers described by `specs` with at most `concurrency` docker calls in flight.
+
+    The /etc/hosts update is left to the caller so that it happens once per run.
+
+    Args:
+        specs (dict): container name -> ContainerSpec
+        index (dict): the result of discover_containers().
+
+    Returns:
+        dict: container name -> (hostname, ip address or None)
+    """
+    backoff = AdaptiveBackoff()
+    started_names = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(provision_container, name, spec, index.get(name, MISSING), timer, backoff): name
+            for name, spec in specs.items()
+        }
+        for future in as_completed(futures):
+            if future.result():
+                started_names.append(futures[future])
+
+    with timer.phase("ip"):
+        ips = {name: index[name].ip for name in started_names if name in index and index[name].ip}
+        ips.update(wait_for_ips([name for name in started_names if name not in ips]))
+
+    results = {}
+    for name, spec in specs.items():
+        results[name] = (spec.hostname, ips.get(name))
+        if name in started_names and name not in ips:
+            log(f"Failed to retrieve IP for '{name}'. Cannot update hosts file.")
+    return results
+
+
+def wait_until_ready(results, timer, timeout=readiness.READY_TIMEOUT, metrics_file=None):
+    """
+    Probes the containers that got an IP until systemd and sshd are up.
+
+    Args:
+        results (dict): the result of provision_containers().
+        timeout (float): deadline of each container in seconds, 0 to skip the probe.
+        metrics_file (str): where to save the per-container time-to-ready, if given.
+
+    Returns:
+        set: the names of the ready containers.
+    """
+    hosts = {name: ip_address for name, (_, ip_address) in results.items() if ip_address}
+    if not timeout:
+        return set(hosts)
+    with timer.phase("ready"):
+        probes = readiness.probe_ready(hosts, timeout)
+    readiness.report(probes)
+    if metrics_file:
+        readiness.write_metrics(probes, metrics_file)
+    return {name for name, probe in probes.items() if probe.ready}
+
+
+def pool_specs(count, image, base_name_template, hostname_template=HOSTNAME_TEMPLATE, pool=None, labels=None):
+    """
+    Expands a pool description into its container name -> ContainerSpec mapping.
+
+    Containers are numbered from 1 to count through the name templates.
+    """
+    pool = pool or pool_name(base_name_template)
+    return {
+        base_name_template.format(i): ContainerSpec(hostname_template.format(i), image, pool, labels or {})
+        for i in range(1, count + 1)
+    }
+
+
+def provision_pool(count, image, base_name_template, hostname_template=HOSTNAME_TEMPLATE,
+                   concurrency=DEFAULT_CONCURRENCY, pool=None, ready_timeout=readiness.READY_TIMEOUT,
+                   metrics_file=None, labels=None):
+    """
+    Creates `count` containers with at most `concurrency` docker calls in flight.
+
+    The function returns once every container is ready (systemd booted and
+    sshd up) or its ready_timeout expired.
+
+    Returns:
+        dict: container name -> (hostname, ip address or None)
+    """
+    timer = PhaseTimer()
+    started = time.monotonic()
+    specs = pool_specs(count, image, base_name_template, hostname_template, pool, labels)
+
+    log(f"Starting provisioning of {count} containers from '{image}' (concurrency={concurrency})...")
+    with timer.phase("discover"):
+        index = discover_containers(specs)
+
+    results = provision_containers(specs, index, timer, concurrency)
+
+    # /etc/hosts is written once, from the main thread, when every IP is known.
+    with timer.phase("hosts"):
+        update_hosts_file({hostname: ip_address for hostname, ip_address in results.values() if ip_address})
+
+    ready = wait_until_ready(results, timer, ready_timeout, metrics_file)
+    timer.report()
+    log(f"{len(ready)}/{count} containers ready in {time.monotonic() - started:.2f}s.")
+    return results
+
+
+def run_cli(count, image, base_name_template, hostname_template=HOSTNAME_TEMPLATE, pool=None, description=None,
+            labels=None):
+    """
+    Command line entry point shared by the generate_*.py scripts.
+
+    The pool description given by the calling script (its pool in pools.yml)
+    gives the defaults, --count and --concurrency override them.
+    """
+    parser = argparse.ArgumentParser(description=description or f"Create a pool of '{image}' containers.")
+    parser.add_argument('--count', type=int, default=count,
+                        help=f'Number of containers to create (default: {count}).')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Maximum number of containers created in parallel (default: {DEFAULT_CONCURRENCY}).')
+    parser.add_argument('--ready-timeout', type=float, default=readiness.READY_TIMEOUT,
+                        help=f'Seconds each container gets to boot systemd and sshd, 0 to not wait '
+                             f'(default: {readiness.READY_TIMEOUT}).')
+    parser.add_argument('--ready-metrics', help='Save the per-container time-to-ready to this JSON file.')
+    args = parser.parse_args()
+
+    # Check for root/sudo privileges, which are required to edit /etc/hosts
+    if os.geteuid() != 0:
+        print("This script needs to modify /etc/hosts, which requires root privileges.")
+        print("Please run it with sudo: sudo python3 your_script_name.py")
+        sys.exit(1)
+
+    provision_pool(args.count, image, base_name_template, hostname_template, args.concurrency, pool,
+                   args.ready_timeout, args.ready_metrics, labels)
+
+    print("\n--- Script finished. ---")
+    print("Running 'docker ps -q' to list running container IDs:")
+    run_command(["docker", "ps", "-q"])
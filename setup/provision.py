@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Declarative provisioning of the lab container pools.
+
+The pools are described in a spec file (pools.yml by default): image, count
+and name templates for each of them. The script compares the spec with the
+live Docker state and only creates the missing containers and removes the
+extra ones, so growing a pool from 25 to 30 nodes costs 5 container starts.
+Existing containers whose image, hostname or labels no longer match the spec
+are reported, and recreated with --recreate-drifted.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from cleanup import get_hostnames, remove_containers_bulk
+from pool_engine import (DEFAULT_CONCURRENCY, HOSTNAME_TEMPLATE, INSPECT_BATCH_SIZE, MISSING, PhaseTimer,
+                         discover_containers, log, pool_specs, provision_containers, run_command,
+                         update_hosts_file, wait_until_ready)
+from readiness import READY_TIMEOUT
+
+# --- Configuration ---
+DEFAULT_SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pools.yml")
+DRIFT_FORMAT = '{{.Name}}\t{{.Config.Image}}\t{{.Config.Hostname}}\t{{json .Config.Labels}}'
+
+
+def read_spec(path):
+    """Reads the spec file, YAML or JSON (by extension), and returns its content as a dict."""
+    with open(path, 'r') as f:
+        if path.endswith(".json"):
+            return json.load(f) or {}
+        if yaml is None:
+            print("Error: PyYAML is required to read a YAML spec (pip install pyyaml), or use a .json spec.")
+            sys.exit(1)
+        return yaml.safe_load(f) or {}
+
+
+def load_spec(path, section="pools", required=("name", "image", "count", "name_template")):
+    """
+    Reads one section of the pool spec file.
+
+    Returns:
+        list: the pool descriptions, each one a dict with name, image, count,
+              name_template and optionally hostname_template and labels.
+    """
+    pools = read_spec(path).get(section) or []
+    for pool in pools:
+        missing = [key for key in required if key not in pool]
+        if missing:
+            print(f"Error: pool {pool.get('name', '?')} in {path} is missing {', '.join(missing)}.")
+            sys.exit(1)
+    return pools
+
+
+def load_pool(name, path=DEFAULT_SPEC):
+    """Returns the description of one pool of the spec file, exits if it is not there."""
+    for pool in load_spec(path):
+        if pool["name"] == name:
+            return pool
+    print(f"Error: no pool named {name} in {path}.")
+    sys.exit(1)
+
+
+def desired_state(pools):
+    """
+    Expands the pool descriptions into the container name -> ContainerSpec mapping.
+    """
+    desired = {}
+    owners = {}
+    for pool in pools:
+        specs = pool_specs(pool["count"], pool["image"], pool["name_template"],
+                           pool.get("hostname_template", HOSTNAME_TEMPLATE), pool["name"], pool.get("labels"))
+        for name, spec in specs.items():
+            if spec.hostname in owners:
+                log(f"Warning: hostname '{spec.hostname}' is used by both '{owners[spec.hostname]}' and '{name}'.")
+            owners[spec.hostname] = name
+        desired.update(specs)
+    return desired
+
+
+def compute_delta(desired, index, pool_names, prune=True):
+    """
+    Compares the desired containers with the live ones.
+
+    Args:
+        desired (dict): container name -> ContainerSpec
+        index (dict): the result of discover_containers().
+        pool_names (set): the pools managed by the spec; containers of other pools are left alone.
+        prune (bool): if False, extra containers are kept.
+
+    Returns:
+        tuple: (to_create, to_start, to_remove)
+               to_create (dict): container name -> ContainerSpec of the missing containers.
+               to_start (dict): container name -> ContainerSpec of the stopped ones.
+               to_remove (list): names of the containers of the managed pools not in the spec.
+    """
+    to_create = {name: spec for name, spec in desired.items() if not index.get(name) or not index[name].exists}
+    to_start = {name: spec for name, spec in desired.items()
+                if name in index and index[name].exists and index[name].state != "running"}
+    to_remove = []
+    if prune:
+        to_remove = sorted(name for name, info in index.items()
+                           if info.pool in pool_names and name not in desired)
+    return to_create, to_start, to_remove
+
+
+def find_drift(desired, index):
+    """
+    Compares the image, hostname and labels of the existing containers with their spec.
+
+    One 'docker inspect' per INSPECT_BATCH_SIZE containers; labels that are not
+    in the spec (added by hand, or by Docker) are ignored.
+
+    Returns:
+        dict: container name -> (current hostname, list of the differences)
+    """
+    names = sorted(name for name in desired if index.get(name) and index[name].exists)
+    drift = {}
+    for offset in range(0, len(names), INSPECT_BATCH_SIZE):
+        success, output = run_command(["docker", "inspect", "-f", DRIFT_FORMAT] + names[offset:offset + INSPECT_BATCH_SIZE],
+                                      capture_output=True)
+        if not success:
+            continue
+        for line in output.splitlines():
+            name, image, hostname, labels = (line.split("\t") + ["", "", ""])[:4]
+            name = name.lstrip("/")
+            spec = desired[name]
+            labels = json.loads(labels or "null") or {}
+            differences = []
+            if image != spec.image:
+                differences.append(f"image {image} -> {spec.image}")
+            if hostname != spec.hostname:
+                differences.append(f"hostname {hostname} -> {spec.hostname}")
+            for key, value in sorted((spec.labels or {}).items()):
+                if labels.get(key) != str(value):
+                    differences.append(f"label {key}={labels.get(key, '')} -> {value}")
+            if differences:
+                drift[name] = (hostname, differences)
+    return drift
+
+
+def reconcile(pools, concurrency=DEFAULT_CONCURRENCY, prune=True, dry_run=False,
+              ready_timeout=READY_TIMEOUT, metrics_file=None, recreate_drifted=False):
+    """
+    Brings the live containers in line with the pools and updates /etc/hosts once.
+
+    Returns once every container is ready or its ready_timeout expired.
+    Drifted containers (see find_drift) are only reported, unless recreate_drifted is True.
+    """
+    timer = PhaseTimer()
+    started = time.monotonic()
+    desired = desired_state(pools)
+
+    with timer.phase("discover"):
+        index = discover_containers(desired)
+    to_create, to_start, to_remove = compute_delta(desired, index, {pool["name"] for pool in pools}, prune)
+    with timer.phase("drift"):
+        drift = find_drift(desired, index)
+
+    log(f"Spec: {len(desired)} containers in {len(pools)} pools. "
+        f"Delta: {len(to_create)} to create, {len(to_start)} to start, {len(to_remove)} to remove, "
+        f"{len(drift)} drifted.")
+    for name in sorted(to_create):
+        log(f"  + {name}")
+    for name in to_remove:
+        log(f"  - {name}")
+    for name, (_, differences) in sorted(drift.items()):
+        log(f"  ~ {name}: {', '.join(differences)}" + ("" if recreate_drifted else " (use --recreate-drifted)"))
+    if dry_run:
+        return
+
+    removed_hostnames = []
+    if to_remove:
+        with timer.phase("remove"):
+            known = {spec.hostname for spec in desired.values()}
+            hostnames = get_hostnames(to_remove)
+            failed = remove_containers_bulk(to_remove)
+            removed_hostnames = [hostname for name, hostname in hostnames.items()
+                                 if hostname and hostname not in known and name not in failed]
+
+    if drift and recreate_drifted:
+        with timer.phase("recreate"):
+            known = {spec.hostname for spec in desired.values()}
+            failed = remove_containers_bulk(sorted(drift))
+            for name, (hostname, _) in drift.items():
+                if name in failed:
+                    # Still there: kept as is, reported again as drifted on the next run
+                    continue
+                if hostname and hostname not in known:
+                    removed_hostnames.append(hostname)
+                # Created again from their spec by provision_containers()
+                index[name] = MISSING
+
+    # Running containers are read from the index, no docker call is made for them.
+    results = provision_containers(desired, index, timer, concurrency)
+
+    with timer.phase("hosts"):
+        update_hosts_file({hostname: ip_address for hostname, ip_address in results.values() if ip_address},
+                          remove=removed_hostnames)
+
+    # Containers that were already running are probed too, it is a single quick check for them.
+    ready = wait_until_ready(results, timer, ready_timeout, metrics_file)
+    timer.report()
+    log(f"{len(ready)}/{len(desired)} containers ready in {time.monotonic() - started:.2f}s.")
+
+
+def main():
+    """
+    Main function to reconcile the container pools with the spec file.
+    """
+    parser = argparse.ArgumentParser(description="Create or remove the lab containers to match a pool spec.")
+    parser.add_argument('--spec', default=DEFAULT_SPEC, help=f'Pool spec file (default: {DEFAULT_SPEC}).')
+    parser.add_argument('--pool', action='append',
+                        help='Only reconcile this pool (can be repeated, default: every pool of the spec).')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Maximum number of containers created in parallel (default: {DEFAULT_CONCURRENCY}).')
+    parser.add_argument('--no-prune', dest='prune', action='store_false',
+                        help='Keep the containers of a pool that are no longer in the spec.')
+    parser.add_argument('--recreate-drifted', action='store_true',
+                        help='Recreate the containers whose image, hostname or labels differ from the spec '
+                             '(default: only report them).')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the delta.')
+    parser.add_argument('--ready-timeout', type=float, default=READY_TIMEOUT,
+                        help=f'Seconds each container gets to boot systemd and sshd, 0 to not wait '
+                             f'(default: {READY_TIMEOUT}).')
+    parser.add_argument('--ready-metrics', help='Save the per-container time-to-ready to this JSON file.')
+    args = parser.parse_args()
+
+    pools = load_spec(args.spec)
+    if args.pool:
+        pools = [pool for pool in pools if pool["name"] in args.pool]
+        if not pools:
+            print(f"Error: no pool named {', '.join(args.pool)} in {args.spec}.")
+            sys.exit(1)
+
+    # Check for root/sudo privileges, which are required to edit /etc/hosts
+    if not args.dry_run and os.geteuid() != 0:
+        print("This script needs to modify /etc/hosts, which requires root privileges.")
+        print("Please run it with sudo: sudo python3 provision.py")
+        sys.exit(1)
+
+    reconcile(pools, args.concurrency, args.prune, args.dry_run, args.ready_timeout, args.ready_metrics,
+              args.recreate_drifted)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Readiness probing of freshly started systemd containers.
+
+A container is ready when systemd has finished booting
+('systemctl is-system-running' answers running or degraded) and sshd answers
+on port 22. All the hosts are probed concurrently, each one with its own
+deadline, and the time each one took to become ready is recorded.
+"""
+import json
+import socket
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Configuration ---
+READY_TIMEOUT = 120
+PROBE_CONCURRENCY = 32
+POLL_INITIAL = 0.2
+POLL_MAX = 2.0
+SSH_PORT = 22
+SYSTEMD_READY_STATES = ("running", "degraded")
+
+ProbeResult = namedtuple("ProbeResult", ["ready", "seconds", "systemd", "ssh"])
+
+
+def systemd_state(name):
+    """
+    Returns the output of 'systemctl is-system-running' in the container.
+
+    'n/a' is returned for images without systemd, which are then only probed on SSH.
+    """
+    try:
+        result = subprocess.run(
+            ["docker", "exec", name, "systemctl", "is-system-running"],
+            capture_output=True, text=True, timeout=10
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return "unknown"
+    # 126/127: systemctl is not there; the state is printed even when the exit code is not 0.
+    if result.returncode in (126, 127) and "executable file not found" in result.stderr + result.stdout:
+        return "n/a"
+    return result.stdout.strip() or "unknown"
+
+
+def ssh_answers(ip_address, port=SSH_PORT):
+    """Checks that something speaking SSH accepts connections on the port."""
+    try:
+        with socket.create_connection((ip_address, port), timeout=2) as sock:
+            sock.settimeout(2)
+            return sock.recv(4).startswith(b"SSH-")
+    except OSError:
+        return False
+
+
+def probe_host(name, ip_address, timeout=READY_TIMEOUT):
+    """
+    Polls one container, with a growing delay, until it is ready or its deadline expires.
+
+    Returns:
+        ProbeResult: ready flag, seconds it took, last systemd state and SSH status.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    delay = POLL_INITIAL
+    state = "unknown"
+    ssh = False
+    while True:
+        if state not in SYSTEMD_READY_STATES and state != "n/a":
+            state = systemd_state(name)
+        if state in SYSTEMD_READY_STATES or state == "n/a":
+            ssh = ssh_answers(ip_address)
+            if ssh:
+                return ProbeResult(True, time.monotonic() - started, state, ssh)
+        if time.monotonic() + delay > deadline:
+            return ProbeResult(False, time.monotonic() - started, state, ssh)
+        time.sleep(delay)
+        delay = min(POLL_MAX, delay * 2)
+
+
+def probe_ready(hosts, timeout=READY_TIMEOUT, concurrency=PROBE_CONCURRENCY):
+    """
+    Probes every container concurrently.
+
+    Args:
+        hosts (dict): container name -> ip address.
+        timeout (float): deadline of each host, in seconds.
+
+    Returns:
+        dict: container name -> ProbeResult
+    """
+    results = {}
+    if not hosts:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hosts)))) as executor:
+        futures = {name: executor.submit(probe_host, name, ip_address, timeout) for name, ip_address in hosts.items()}
+        for name, future in futures.items():
+            results[name] = future.result()
+            result = results[name]
+            if result.ready:
+                print(f"Container '{name}' ready in {result.seconds:.2f}s (systemd: {result.systemd}).", flush=True)
+            else:
+                print(f"Container '{name}' not ready after {result.seconds:.0f}s "
+                      f"(systemd: {result.systemd}, ssh: {'up' if result.ssh else 'down'}).", flush=True)
+    return results
+
+
+def report(results):
+    """Prints the time-to-ready distribution of the probed containers."""
+    durations = sorted(result.seconds for result in results.values() if result.ready)
+    print("\n--- Time to ready ---")
+    print(f"{len(durations)}/{len(results)} containers ready.")
+    if durations:
+        def percentile(p):
+            return durations[min(len(durations) - 1, int(p * len(durations)))]
+        print(f"p50 {percentile(0.5):.2f}s  p90 {percentile(0.9):.2f}s  max {durations[-1]:.2f}s")
+
+
+def write_metrics(results, path):
+    """Saves the per-host readiness metrics as JSON."""
+    with open(path, 'w') as f:
+        json.dump({name: result._asdict() for name, result in sorted(results.items())}, f, indent=2)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Warm pool of booted, SSH-ready systemd containers for playbook test runs.
+
+The `warm_pools` section of pools.yml gives, for each image, how many
+containers to keep ready. A test job checks one out (a locked read/write of
+the state file, no docker call), runs its playbook against it and checks it
+back in; the container is then recreated in the background from its image
+and goes back to the pool once it is ready again.
+
+    sudo python3 warm_pool.py fill                      # create the pools
+    sudo python3 warm_pool.py serve &                   # keep them full
+    python3 warm_pool.py checkout --pool warm-almalinux # -> {"name": ..., "ip": ...}
+    python3 warm_pool.py checkin warm-a3
+
+The state lives in /var/lib/lab-pool (--state-dir or LAB_POOL_STATE_DIR),
+created group-writable for the LAB_POOL_GROUP group (default: docker), so
+that the members of that group check containers out and in without sudo.
+"""
+import argparse
+import fcntl
+import grp
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from pool_engine import (DEFAULT_CONCURRENCY, HOSTNAME_TEMPLATE, ContainerSpec, MISSING, PhaseTimer,
+                         discover_containers, log, provision_containers, run_command, wait_until_ready)
+from provision import DEFAULT_SPEC, load_spec
+from readiness import READY_TIMEOUT
+
+# --- Configuration ---
+STATE_DIR = "/var/lib/lab-pool"
+STATE_DIR_ENV = "LAB_POOL_STATE_DIR"
+STATE_FILE = "warm_pool.json"
+RESET_LOG = "reset.log"
+# Group allowed to use the pools without sudo (the state files are group-writable)
+STATE_GROUP = os.environ.get("LAB_POOL_GROUP", "docker")
+WARM_LABELS = {"lab.warm": "true"}
+SERVE_INTERVAL = 5
+LEASE_SECONDS = 3600
+
+READY = "ready"
+CHECKED_OUT = "checked_out"
+RESETTING = "resetting"
+RECREATING = "recreating"
+
+
+def state_path(name):
+    """
+    Returns the path of a file of the state directory, created if needed.
+
+    The directory is setgid and group-writable for STATE_GROUP, so the files
+    created in it (by root or by a member of the group) belong to that group.
+    """
+    directory = os.environ.get(STATE_DIR_ENV, STATE_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+        try:
+            os.chown(directory, -1, grp.getgrnam(STATE_GROUP).gr_gid)
+            os.chmod(directory, 0o2775)
+        except (KeyError, PermissionError):
+            pass
+    return os.path.join(directory, name)
+
+
+def open_shared(path, mode):
+    """Opens a state file, making it group-writable when this process creates it."""
+    f = open(path, mode)
+    try:
+        if os.fstat(f.fileno()).st_uid == os.getuid():
+            os.fchmod(f.fileno(), 0o664)
+    except PermissionError:
+        pass
+    return f
+
+
+@contextmanager
+def locked_state(path=None):
+    """
+    Opens the state file under an exclusive lock and saves it back on exit.
+
+    The state maps each container name to its pool, hostname, ip, status
+    (ready, checked_out, resetting or recreating), owner and the time of its
+    last change.
+    """
+    path = path or state_path(STATE_FILE)
+    with open_shared(path + ".lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        state.setdefault("containers", {})
+        yield state
+        temp_path = path + ".tmp"
+        with open_shared(temp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, path)
+
+
+def warm_specs(pool):
+    """Returns the name -> ContainerSpec mapping of a warm pool description."""
+    hostname_template = pool.get("hostname_template", HOSTNAME_TEMPLATE)
+    labels = dict(WARM_LABELS, **(pool.get("labels") or {}))
+    return {
+        pool["name_template"].format(i): ContainerSpec(hostname_template.format(i), pool["image"], pool["name"], labels)
+        for i in range(1, pool["size"] + 1)
+    }
+
+
+def bring_up(specs, index, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Creates (or starts) the given containers and waits until systemd and sshd are up.
+
+    Returns:
+        dict: container name -> ip address of the containers that are ready.
+    """
+    results = provision_containers(specs, index, PhaseTimer(), concurrency)
+    ready = wait_until_ready(results, PhaseTimer())
+    return {name: ip_address for name, (_, ip_address) in results.items() if name in ready}
+
+
+def mark_ready(pool, specs, ready):
+    """Records the ready containers in the state file."""
+    with locked_state() as state:
+        for name, ip_address in ready.items():
+            state["containers"][name] = {
+                "pool": pool, "hostname": specs[name].hostname, "ip": ip_address,
+                "status": READY, "owner": None, "since": time.time(),
+            }
+
+
+def fill(pools, concurrency=DEFAULT_CONCURRENCY):
+    """Creates the containers missing from the warm pools."""
+    pool_specs = [(pool, warm_specs(pool)) for pool in pools]
+    # Only the pool members are inspected, not every running container of the host.
+    index = discover_containers([name for _, specs in pool_specs for name in specs])
+    for pool, specs in pool_specs:
+        with locked_state() as state:
+            known = state["containers"]
+            # Containers being reset are left to reset(), even if docker does not list them right now.
+            missing = {name: spec for name, spec in specs.items()
+                       if name not in known
+                       or (known[name]["status"] in (READY, CHECKED_OUT) and not index.get(name, MISSING).exists)}
+            for name in missing:
+                known.pop(name, None)
+        if not missing:
+            continue
+        log(f"Warming {len(missing)} containers in pool '{pool['name']}'...")
+        mark_ready(pool["name"], specs, bring_up(missing, index, concurrency))
+
+
+def checkout(pool_name, owner=None, wait=0):
+    """
+    Hands out a ready container of the pool.
+
+    Returns:
+        dict or None: the state entry of the container (with its name), None if none got ready in time.
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        with locked_state() as state:
+            for name, entry in sorted(state["containers"].items()):
+                if entry["pool"] == pool_name and entry["status"] == READY:
+                    entry.update(status=CHECKED_OUT, owner=owner, since=time.time())
+                    return dict(entry, name=name)
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.2)
+
+
+def checkin(name, background=True, spec=DEFAULT_SPEC):
+    """
+    Gives a container back; it is recreated before being handed out again.
+
+    With background=True a detached 'reset' process recreates it, otherwise
+    it is left to the next round of 'serve'.
+    """
+    with locked_state() as state:
+        entry = state["containers"].get(name)
+        if entry is None:
+            log(f"Container '{name}' is not part of a warm pool.")
+            return False
+        entry.update(status=RESETTING, owner=None, since=time.time())
+    if background:
+        with open_shared(state_path(RESET_LOG), 'a') as reset_log:
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--spec", spec, "reset", name],
+                             stdout=reset_log, stderr=subprocess.STDOUT, start_new_session=True)
+    return True
+
+
+def reset(names, pools, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Removes the given containers and recreates them from their image.
+
+    The containers are first claimed (status recreating) under the lock, so
+    that a background reset and 'serve' never recreate the same one twice.
+    """
+    specs = {}
+    for pool in pools:
+        specs.update(warm_specs(pool))
+    with locked_state() as state:
+        claimed = []
+        for name in names:
+            entry = state["containers"].get(name)
+            if name in specs and (entry is None or entry["status"] != RECREATING):
+                if entry is not None:
+                    entry.update(status=RECREATING, since=time.time())
+                claimed.append(name)
+    names = claimed
+    if not names:
+        return
+    log(f"Resetting {', '.join(names)}...")
+    run_command(["docker", "rm", "-f"] + names)
+    by_pool = {}
+    for name in names:
+        by_pool.setdefault(specs[name].pool, {})[name] = specs[name]
+    for pool, pool_specs in by_pool.items():
+        mark_ready(pool, specs, bring_up(pool_specs, {}, concurrency))
+
+
+def serve(pools, interval=SERVE_INTERVAL, lease=LEASE_SECONDS, concurrency=DEFAULT_CONCURRENCY):
+    """Keeps the warm pools full: resets the returned or expired containers and refills the pools."""
+    while True:
+        now = time.time()
+        with locked_state() as state:
+            to_reset = [name for name, entry in state["containers"].items()
+                        if (entry["status"] == RESETTING and now - entry["since"] > interval)
+                        or (entry["status"] == CHECKED_OUT and now - entry["since"] > lease)
+                        or (entry["status"] == RECREATING and now - entry["since"] > 2 * READY_TIMEOUT)]
+            for name in to_reset:
+                state["containers"][name].update(status=RESETTING, owner=None, since=now)
+        reset(to_reset, pools, concurrency)
+        fill(pools, concurrency)
+        time.sleep(interval)
+
+
+def status():
+    """Prints the content of the warm pools."""
+    with locked_state() as state:
+        containers = state["containers"]
+    print(f"{'name':<20}{'pool':<20}{'ip':<16}{'status':<13}{'owner':<16}{'age(s)':>8}")
+    for name, entry in sorted(containers.items()):
+        print(f"{name:<20}{entry['pool']:<20}{entry['ip'] or '':<16}{entry['status']:<13}"
+              f"{entry['owner'] or '':<16}{time.time() - entry['since']:>8.0f}")
+
+
+def main():
+    """
+    Main function to manage the warm container pools.
+    """
+    parser = argparse.ArgumentParser(description="Warm pool of ready systemd containers for test runs.")
+    parser.add_argument('--spec', default=DEFAULT_SPEC, help=f'Pool spec file (default: {DEFAULT_SPEC}).')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Maximum number of containers created in parallel (default: {DEFAULT_CONCURRENCY}).')
+    parser.add_argument('--state-dir', default=os.environ.get(STATE_DIR_ENV, STATE_DIR),
+                        help=f'Directory of the pool state (default: ${STATE_DIR_ENV}, else {STATE_DIR}).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('fill', help='Create the containers missing from the warm pools.')
+    serve_parser = subparsers.add_parser('serve', help='Keep the warm pools full.')
+    serve_parser.add_argument('--interval', type=float, default=SERVE_INTERVAL)
+    serve_parser.add_argument('--lease', type=int, default=LEASE_SECONDS,
+                              help='Seconds after which a checked out container is taken back.')
+    checkout_parser = subparsers.add_parser('checkout', help='Get a ready container (printed as JSON).')
+    checkout_parser.add_argument('--pool', required=True)
+    checkout_parser.add_argument('--owner', default=os.environ.get("USER"))
+    checkout_parser.add_argument('--wait', type=float, default=0,
+                                 help='Seconds to wait for a ready container (default: 0).')
+    checkin_parser = subparsers.add_parser('checkin', help='Give a container back.')
+    checkin_parser.add_argument('name')
+    checkin_parser.add_argument('--no-reset', dest='background', action='store_false',
+                                help="Leave the reset to 'serve' instead of starting it now.")
+    reset_parser = subparsers.add_parser('reset', help='Recreate containers now.')
+    reset_parser.add_argument('names', nargs='+')
+    subparsers.add_parser('status', help='Show the warm pools.')
+    args = parser.parse_args()
+    # Through the environment, so that the background resets use the same state
+    os.environ[STATE_DIR_ENV] = args.state_dir
+
+    if args.command == 'checkout':
+        entry = checkout(args.pool, args.owner, args.wait)
+        if entry is None:
+            print(f"No ready container in pool '{args.pool}'.", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(entry))
+    elif args.command == 'checkin':
+        sys.exit(0 if checkin(args.name, args.background, args.spec) else 1)
+    elif args.command == 'status':
+        status()
+    else:
+        pools = load_spec(args.spec, "warm_pools", ("name", "image", "size", "name_template"))
+        if args.command == 'fill':
+            fill(pools, args.concurrency)
+        elif args.command == 'reset':
+            reset(args.names, pools, args.concurrency)
+        else:
+            serve(pools, args.interval, args.lease, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()